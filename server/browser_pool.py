@@ -0,0 +1,243 @@
+import os
+import logging
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Deque, Dict, List, Optional, Set
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+
+if TYPE_CHECKING:
+    from browser_use import BrowserSession
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ===== Warm Browser Pool =====
+
+def _origin(url: str) -> Optional[str]:
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.netloc:
+        return None
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+class _PooledSession:
+    """A pre-launched browser session, the number of tasks it has served and the origins they visited"""
+
+    def __init__(self, session: "BrowserSession"):
+        self.session = session
+        self.tasks_run = 0
+        self.origins: Set[str] = set()
+
+class BrowserPool:
+    """Pool of pre-launched browser sessions leased to agent runs; bounds concurrently leased browsers to its size"""
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_tasks_per_session: int = 20,
+        headless: bool = True,
+        health_check_timeout_seconds: float = 5.0,
+    ):
+        self.size = size
+        self.max_tasks_per_session = max_tasks_per_session
+        self.headless = headless
+        self.health_check_timeout_seconds = health_check_timeout_seconds
+        self._idle: Deque[_PooledSession] = deque()
+        self._created = 0
+        # Notified whenever a browser goes idle or a slot frees up
+        self._available = asyncio.Condition()
+        self.leases = 0
+        self.recycled = 0
+
+    def _new_session(self) -> "BrowserSession":
+        # Imported here so the server starts without loading browser_use
+        from browser_use import BrowserProfile, BrowserSession
+        # keep_alive stops Agent.run() from tearing the browser down when it finishes
+        profile = BrowserProfile(headless=self.headless, keep_alive=True)
+        return BrowserSession(browser_profile=profile)
+
+    async def _launch(self) -> _PooledSession:
+        session = self._new_session()
+        pooled = _PooledSession(session)
+        try:
+            await session.start()
+            await self._track_origins(pooled)
+        except Exception:
+            # A half-started session may already own a Chromium process
+            await self._kill(session)
+            raise
+        return pooled
+
+    @staticmethod
+    async def _track_origins(pooled: _PooledSession) -> None:
+        """Record the origin of every page the browser opens, including tabs closed before cleanup"""
+
+        def on_target_info(event: Dict[str, Any], session_id: Optional[str] = None) -> None:
+            origin = _origin(event["targetInfo"].get("url", ""))
+            if origin:
+                pooled.origins.add(origin)
+
+        client = pooled.session.cdp_client
+        client.register.Target.targetCreated(on_target_info)
+        client.register.Target.targetInfoChanged(on_target_info)
+        await client.send.Target.setDiscoverTargets(params={"discover": True})
+
+    @staticmethod
+    async def _kill(session: "BrowserSession") -> None:
+        try:
+            await session.kill()
+        except Exception as e:
+            logger.error("Error closing browser: %s", e)
+
+    async def start(self) -> None:
+        """Pre-launch every browser in the pool"""
+        async with self._available:
+            missing = self.size - self._created
+            if missing <= 0:
+                return
+            self._created += missing
+        results = await asyncio.gather(*(self._launch() for _ in range(missing)), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error("Error pre-launching browser: %s", result)
+                await self._discard()
+            else:
+                await self._release(result)
+        logger.info("Browser pool warmed with %s sessions", len(self._idle))
+
+    async def _acquire(self) -> _PooledSession:
+        async with self._available:
+            while True:
+                if self._idle:
+                    return self._idle.popleft()
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                await self._available.wait()
+        try:
+            return await self._launch()
+        except Exception:
+            await self._discard()
+            raise
+
+    async def _is_healthy(self, pooled: _PooledSession) -> bool:
+        """Probe the browser over CDP; a session that does not answer in time is recycled"""
+        if pooled.tasks_run >= self.max_tasks_per_session or pooled.session.agent_focus is None:
+            return False
+        try:
+            await asyncio.wait_for(pooled.session.get_current_page_url(), self.health_check_timeout_seconds)
+            return True
+        except Exception as e:
+            logger.warning("Browser failed its health check, recycling it: %r", e)
+            return False
+
+    async def _recycle(self, pooled: _PooledSession) -> _PooledSession:
+        self.recycled += 1
+        await self._kill(pooled.session)
+        return await self._launch()
+
+    @staticmethod
+    async def _clean(pooled: _PooledSession) -> None:
+        """Reset a session to a single blank tab with no cookies, cache or site storage"""
+        session = pooled.session
+        tabs = await session.get_tabs()
+        await session.navigate_to("about:blank", new_tab=True)
+        for tab in tabs:
+            await session.close_page(tab.target_id)
+
+        # Cleared once the pages are closed, so they cannot write anything back
+        await session.clear_cookies()
+        cdp_session = await session.get_or_create_cdp_session()
+        await cdp_session.cdp_client.send.Network.clearBrowserCache(session_id=cdp_session.session_id)
+        origins, pooled.origins = pooled.origins, set()
+        for origin in origins:
+            # localStorage, IndexedDB, Cache Storage, service workers, ...
+            await session.cdp_client.send.Storage.clearDataForOrigin(params={"origin": origin, "storageTypes": "all"})
+
+    async def _release(self, pooled: _PooledSession) -> None:
+        async with self._available:
+            self._idle.append(pooled)
+            self._available.notify()
+
+    async def _discard(self) -> None:
+        # Frees the slot for a caller waiting in _acquire, who launches a replacement
+        async with self._available:
+            self._created -= 1
+            self._available.notify()
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator["BrowserSession"]:
+        """Lease a clean, healthy browser session for the duration of one task"""
+        pooled = await self._acquire()
+        try:
+            if not await self._is_healthy(pooled):
+                pooled = await self._recycle(pooled)
+        except Exception:
+            # Never drop a slot while its browser may still be running
+            await self._kill(pooled.session)
+            await self._discard()
+            raise
+
+        self.leases += 1
+        try:
+            yield pooled.session
+        finally:
+            pooled.tasks_run += 1
+            try:
+                await self._clean(pooled)
+                await self._release(pooled)
+            except Exception as e:
+                logger.error("Error cleaning browser session, discarding it: %s", e)
+                await self._kill(pooled.session)
+                await self._discard()
+
+    def _attach_session(self, browser_session: "BrowserSession") -> "BrowserSession":
+        from browser_use import BrowserProfile, BrowserSession
+        # A second CDP connection to the same browser process; stop() detaches without closing it
+        profile = BrowserProfile(cdp_url=browser_session.cdp_url, headless=self.headless, keep_alive=True)
+        return BrowserSession(browser_profile=profile)
+
+    @asynccontextmanager
+    async def tab(self, browser_session: "BrowserSession") -> AsyncIterator["BrowserSession"]:
+        """Drive a new tab of a leased browser through its own session, so agents can share one browser"""
+        tab_session = self._attach_session(browser_session)
+        target_id = None
+        try:
+            await tab_session.start()
+            await tab_session.navigate_to("about:blank", new_tab=True)
+            target_id = tab_session.agent_focus.target_id
+            yield tab_session
+        finally:
+            try:
+                if target_id:
+                    await tab_session.close_page(target_id)
+                await tab_session.stop()
+            except Exception as e:
+                logger.error("Error closing browser tab: %s", e)
+
+    async def close(self) -> None:
+        """Shut down every idle browser in the pool"""
+        sessions: List[_PooledSession] = list(self._idle)
+        self._idle.clear()
+        for pooled in sessions:
+            await self._kill(pooled.session)
+            await self._discard()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "created": self._created,
+            "idle": len(self._idle),
+            "leases": self.leases,
+            "recycled": self.recycled,
+            "max_tasks_per_session": self.max_tasks_per_session,
+        }
+
+browser_pool = BrowserPool(
+    size=int(os.getenv("BROWSER_POOL_SIZE", "2")),
+    max_tasks_per_session=int(os.getenv("BROWSER_POOL_MAX_TASKS_PER_SESSION", "20")),
+    headless=os.getenv("BROWSER_HEADLESS", "true").lower() == "true",
+    health_check_timeout_seconds=float(os.getenv("BROWSER_POOL_HEALTH_CHECK_TIMEOUT_SECONDS", "5")),
+)
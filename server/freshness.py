@@ -0,0 +1,157 @@
+import os
+import re
+import time
+import logging
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from utils import cache_response_async, get_cached_response_async, get_cached_responses_async, normalize_prompt
+from metrics import count_cache_freshness, count_cache_revalidation
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ===== Freshness Classes =====
+
+class FreshnessClass:
+    """A class of tasks and how long their cached answers are fresh, then servable while stale"""
+
+    def __init__(self, name: str, ttl_seconds: float, stale_seconds: float, pattern: Optional[str] = None):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.pattern = re.compile(pattern, re.IGNORECASE) if pattern else None
+
+    def matches(self, task: str) -> bool:
+        return self.pattern is not None and self.pattern.search(task) is not None
+
+def _freshness_class(name: str, ttl_seconds: float, stale_seconds: float, pattern: Optional[str] = None) -> FreshnessClass:
+    prefix = f"CACHE_{name.upper()}"
+    return FreshnessClass(
+        name,
+        ttl_seconds=float(os.getenv(f"{prefix}_TTL_SECONDS", str(ttl_seconds))),
+        stale_seconds=float(os.getenv(f"{prefix}_STALE_SECONDS", str(stale_seconds))),
+        pattern=os.getenv(f"{prefix}_PATTERN", pattern),
+    )
+
+# Checked in order; tasks matching none use the default class
+FRESHNESS_CLASSES: List[FreshnessClass] = [
+    _freshness_class(
+        "live", 300, 900,
+        r"\b(top|number \d+|#\d+|first|latest|newest|current|today|now|trending|price|stock|score|weather|news"
+        r"|show hn|ask hn|front ?page)\b",
+    ),
+    _freshness_class(
+        "static", 604800, 2592000,
+        r"\b(definition|define|meaning of|what is|who (is|was)|history of|documentation|docs|how to)\b",
+    ),
+]
+DEFAULT_FRESHNESS_CLASS = _freshness_class("default", 3600, 82800)
+
+def classify_task(task: str) -> FreshnessClass:
+    for freshness_class in FRESHNESS_CLASSES:
+        if freshness_class.matches(task):
+            return freshness_class
+    return DEFAULT_FRESHNESS_CLASS
+
+# ===== Cache Entries =====
+
+# Entries are "<prefix><created_at>:<ttl>:<stale>:<payload>"; anything else predates freshness tracking
+ENTRY_PREFIX = "fresh1:"
+
+def wrap_entry(response: str, freshness_class: FreshnessClass, created_at: Optional[float] = None) -> str:
+    created_at = time.time() if created_at is None else created_at
+    return f"{ENTRY_PREFIX}{created_at:.3f}:{freshness_class.ttl_seconds:g}:{freshness_class.stale_seconds:g}:{response}"
+
+def unwrap_entry(value: str) -> Tuple[str, Optional[float], float, float]:
+    """Split a cache entry into (payload, created_at, ttl_seconds, stale_seconds)"""
+    if not value.startswith(ENTRY_PREFIX):
+        return value, None, 0.0, 0.0
+    try:
+        created_at, ttl_seconds, stale_seconds, response = value[len(ENTRY_PREFIX):].split(":", 3)
+        return response, float(created_at), float(ttl_seconds), float(stale_seconds)
+    except ValueError:
+        return value, None, 0.0, 0.0
+
+def entry_state(created_at: Optional[float], ttl_seconds: float, stale_seconds: float, now: Optional[float] = None) -> str:
+    # Legacy entries have no creation time; serve them once more and refresh
+    if created_at is None:
+        return "stale"
+    age = (time.time() if now is None else now) - created_at
+    if age <= ttl_seconds:
+        return "fresh"
+    if age <= ttl_seconds + stale_seconds:
+        return "stale"
+    return "expired"
+
+freshness_counts: Dict[str, int] = {"fresh": 0, "stale": 0, "expired": 0, "miss": 0}
+
+def _count(state: str) -> None:
+    freshness_counts[state] += 1
+    count_cache_freshness(state)
+
+def _resolve(value: Optional[str]) -> Tuple[Optional[str], str]:
+    if not value or value == "data=[]":
+        _count("miss")
+        return None, "miss"
+    response, created_at, ttl_seconds, stale_seconds = unwrap_entry(value)
+    state = entry_state(created_at, ttl_seconds, stale_seconds)
+    _count(state)
+    return (None if state == "expired" else response), state
+
+async def lookup_cached_response_async(task: str) -> Tuple[Optional[str], str]:
+    """Return (payload, state) for a task; payload is None on a miss or an expired entry"""
+    return _resolve(await get_cached_response_async(task))
+
+async def lookup_cached_responses_async(tasks: List[str]) -> List[Tuple[Optional[str], str]]:
+    """Bulk version of lookup_cached_response_async"""
+    return [_resolve(value) for value in await get_cached_responses_async(tasks)]
+
+async def cache_fresh_response_async(task: str, response: str) -> bool:
+    """Cache an answer stamped with its creation time and the TTL of the task's class"""
+    freshness_class = classify_task(task)
+    return await cache_response_async(
+        task,
+        wrap_entry(response, freshness_class),
+        ttl_seconds=freshness_class.ttl_seconds + freshness_class.stale_seconds,
+    )
+
+# ===== Stale-While-Revalidate =====
+
+# Refreshes in flight by normalized task, so a burst of stale hits triggers one agent run
+_revalidations: Dict[str, asyncio.Task] = {}
+
+def revalidate_in_background(task: str, runner: Callable[[str], Awaitable[Tuple[str, bool]]]) -> bool:
+    """Refresh a stale entry with a background agent run; False if one is already running"""
+    key = normalize_prompt(task)
+    if key in _revalidations:
+        return False
+
+    async def refresh() -> None:
+        try:
+            result, cacheable = await runner(task)
+            if cacheable:
+                await cache_fresh_response_async(task, result)
+            count_cache_revalidation("refreshed")
+        except Exception as e:
+            count_cache_revalidation("error")
+            logger.error("Error refreshing stale cache entry for %r: %s", task[:50], e)
+        finally:
+            _revalidations.pop(key, None)
+
+    _revalidations[key] = asyncio.create_task(refresh())
+    return True
+
+def freshness_stats() -> Dict[str, Any]:
+    return {
+        **freshness_counts,
+        "revalidating": len(_revalidations),
+        "classes": {
+            freshness_class.name: {
+                "ttl_seconds": freshness_class.ttl_seconds,
+                "stale_seconds": freshness_class.stale_seconds,
+            }
+            for freshness_class in FRESHNESS_CLASSES + [DEFAULT_FRESHNESS_CLASS]
+        },
+    }
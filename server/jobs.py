@@ -0,0 +1,482 @@
+import os
+import logging
+import json
+import time
+import uuid
+import socket
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from redis.exceptions import WatchError
+from utils import async_redis_client, store_conversation_history_async
+from metrics import count_redis_round_trip
+from freshness import cache_fresh_response_async, lookup_cached_response_async, revalidate_in_background
+from results import result_to_response
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Agent runner injected by main.py: takes a task and optional user and returns (result, cacheable)
+AgentRunner = Callable[..., Awaitable[Tuple[str, bool]]]
+
+# Default owner of jobs submitted without a user; shares a queue quota but gets no per-user memory
+ANONYMOUS_USER_ID = "anonymous"
+
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+# Edits a job in place and returns whether it changed; applied atomically by the backends' update()
+JobChange = Callable[[Dict[str, Any]], bool]
+
+class QueueFullError(Exception):
+    """Raised when a job cannot be queued because the queue or the user's quota is full"""
+
+# ===== Queue Backends =====
+
+class InMemoryJobBackend:
+    """Single-process job queue that serves users round-robin"""
+
+    def __init__(self, max_size: int, max_per_user: int, result_ttl_seconds: float):
+        self.max_size = max_size
+        self.max_per_user = max_per_user
+        self.result_ttl_seconds = result_ttl_seconds
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._queues: Dict[str, Deque[str]] = {}
+        self._users: Deque[str] = deque()
+        self._queued = 0
+        self._ready = asyncio.Condition()
+
+    async def enqueue(self, job: Dict[str, Any]) -> None:
+        user_id = job["user_id"]
+        async with self._ready:
+            user_queue = self._queues.get(user_id)
+            if self._queued >= self.max_size:
+                raise QueueFullError("Job queue is full")
+            if user_queue is not None and len(user_queue) >= self.max_per_user:
+                raise QueueFullError(f"Too many queued jobs for user {user_id}")
+            await self.save(job)
+            if user_queue is None:
+                user_queue = self._queues[user_id] = deque()
+                self._users.append(user_id)
+            user_queue.append(job["id"])
+            self._queued += 1
+            self._ready.notify()
+
+    async def dequeue(self, timeout: float) -> Optional[str]:
+        async with self._ready:
+            if not self._users:
+                try:
+                    await asyncio.wait_for(self._ready.wait(), timeout)
+                except asyncio.TimeoutError:
+                    return None
+                if not self._users:
+                    return None
+            # Take one job from the next user in line, then move them to the back
+            user_id = self._users.popleft()
+            user_queue = self._queues[user_id]
+            job_id = user_queue.popleft()
+            if user_queue:
+                self._users.append(user_id)
+            else:
+                del self._queues[user_id]
+            self._queued -= 1
+            return job_id
+
+    async def ack(self, job_id: str) -> None:
+        pass
+
+    async def touch(self, job_id: str) -> None:
+        pass
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        self._jobs[job["id"]] = job
+        self._jobs.move_to_end(job["id"])
+        self._prune()
+
+    async def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def update(self, job_id: str, change: JobChange) -> Tuple[Optional[Dict[str, Any]], bool]:
+        # Nothing awaits between the read and the write, so this is atomic within the process
+        job = await self.load(job_id)
+        if job is None or not change(job):
+            return job, False
+        await self.save(job)
+        return job, True
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.result_ttl_seconds
+        for job_id in [
+            job_id for job_id, job in self._jobs.items()
+            if job.get("finished_at") and job["finished_at"] < cutoff
+        ]:
+            del self._jobs[job_id]
+
+    async def queued(self) -> int:
+        return self._queued
+
+class RedisStreamJobBackend:
+    """Job queue on a Redis stream consumer group shared by every uvicorn worker; fairness via per-user quotas"""
+
+    stream_key = "agent_jobs:stream"
+    group = "agent_workers"
+    queued_key = "agent_jobs:queued"
+    queued_per_user_key = "agent_jobs:queued_per_user"
+
+    def __init__(
+        self,
+        max_size: int,
+        max_per_user: int,
+        result_ttl_seconds: float,
+        claim_idle_seconds: float = 60.0,
+        max_attempts: int = 3,
+    ):
+        self.max_size = max_size
+        self.max_per_user = max_per_user
+        self.result_ttl_seconds = result_ttl_seconds
+        self.claim_idle_seconds = claim_idle_seconds
+        self.max_attempts = max_attempts
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._group_ready = False
+        self._pending_acks: Dict[str, str] = {}
+        self._next_claim_at = 0.0
+
+    async def _ensure_group(self) -> None:
+        if self._group_ready:
+            return
+        try:
+            count_redis_round_trip("xgroup_create")
+            await async_redis_client.xgroup_create(self.stream_key, self.group, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    async def enqueue(self, job: Dict[str, Any]) -> None:
+        await self._ensure_group()
+        user_id = job["user_id"]
+        pipe = async_redis_client.pipeline(transaction=True)
+        pipe.incr(self.queued_key)
+        pipe.hincrby(self.queued_per_user_key, user_id, 1)
+        count_redis_round_trip("pipeline")
+        queued, queued_for_user = await pipe.execute()
+        if queued > self.max_size or queued_for_user > self.max_per_user:
+            await self._release_slot(user_id)
+            if queued > self.max_size:
+                raise QueueFullError("Job queue is full")
+            raise QueueFullError(f"Too many queued jobs for user {user_id}")
+        try:
+            await self.save(job)
+            count_redis_round_trip("xadd")
+            await async_redis_client.xadd(self.stream_key, {"job_id": job["id"], "user_id": user_id})
+        except Exception:
+            # The job never reached the stream, so no worker will release its slot
+            await self._release_slot(user_id)
+            raise
+
+    async def _release_slot(self, user_id: str) -> None:
+        pipe = async_redis_client.pipeline(transaction=True)
+        pipe.decr(self.queued_key)
+        pipe.hincrby(self.queued_per_user_key, user_id, -1)
+        count_redis_round_trip("pipeline")
+        await pipe.execute()
+
+    async def dequeue(self, timeout: float) -> Optional[str]:
+        await self._ensure_group()
+        if time.time() >= self._next_claim_at:
+            self._next_claim_at = time.time() + self.claim_idle_seconds / 4
+            job_id = await self._claim_stale()
+            if job_id is not None:
+                return job_id
+        count_redis_round_trip("xreadgroup")
+        entries = await async_redis_client.xreadgroup(
+            self.group, self.consumer, {self.stream_key: ">"}, count=1, block=int(timeout * 1000)
+        )
+        if not entries:
+            return None
+        _, messages = entries[0]
+        message_id, fields = messages[0]
+        await self._release_slot(fields["user_id"])
+        self._pending_acks[fields["job_id"]] = message_id
+        return fields["job_id"]
+
+    async def _claim_stale(self) -> Optional[str]:
+        """Take over a job whose worker stopped touching it (e.g. crashed) and queue it for another attempt"""
+        count_redis_round_trip("xautoclaim")
+        _, messages, *_ = await async_redis_client.xautoclaim(
+            self.stream_key, self.group, self.consumer,
+            min_idle_time=int(self.claim_idle_seconds * 1000), start_id="0-0", count=1,
+        )
+        if not messages:
+            return None
+        message_id, fields = messages[0]
+        job_id = fields["job_id"]
+        self._pending_acks[job_id] = message_id
+
+        def retry(job: Dict[str, Any]) -> bool:
+            # Anything but a running job is already finished, or was handed back on shutdown
+            if job["status"] != "running":
+                return False
+            job["attempts"] = job.get("attempts", 1) + 1
+            if job.get("cancel_requested"):
+                job["status"] = "cancelled"
+            elif job["attempts"] > self.max_attempts:
+                job["status"] = "failed"
+                job["error"] = f"Worker stopped {self.max_attempts} times while running the job"
+            else:
+                job["status"] = "queued"
+                job["started_at"] = None
+            if job["status"] != "queued":
+                job["finished_at"] = time.time()
+            return True
+
+        job, changed = await self.update(job_id, retry)
+        if changed:
+            logger.warning("Reclaimed job %s from a stalled worker (%s)", job_id, job["status"])
+        return job_id
+
+    async def ack(self, job_id: str) -> None:
+        message_id = self._pending_acks.pop(job_id, None)
+        if message_id is not None:
+            count_redis_round_trip("xack")
+            await async_redis_client.xack(self.stream_key, self.group, message_id)
+
+    async def touch(self, job_id: str) -> None:
+        """Reset the entry's idle time so other workers don't reclaim a job that is still running"""
+        message_id = self._pending_acks.get(job_id)
+        if message_id is not None:
+            count_redis_round_trip("xclaim")
+            await async_redis_client.xclaim(
+                self.stream_key, self.group, self.consumer, min_idle_time=0, message_ids=[message_id], justid=True
+            )
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        count_redis_round_trip("set")
+        await async_redis_client.set(f"agent_job:{job['id']}", json.dumps(job), ex=int(self.result_ttl_seconds))
+
+    async def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        count_redis_round_trip("get")
+        payload = await async_redis_client.get(f"agent_job:{job_id}")
+        return json.loads(payload) if payload is not None else None
+
+    async def update(self, job_id: str, change: JobChange) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Read-modify-write a job under WATCH, retrying if another worker wrote it in between"""
+        key = f"agent_job:{job_id}"
+        async with async_redis_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    count_redis_round_trip("watch")
+                    await pipe.watch(key)
+                    count_redis_round_trip("get")
+                    payload = await pipe.get(key)
+                    job = json.loads(payload) if payload is not None else None
+                    if job is None or not change(job):
+                        count_redis_round_trip("unwatch")
+                        await pipe.unwatch()
+                        return job, False
+                    pipe.multi()
+                    pipe.set(key, json.dumps(job), ex=int(self.result_ttl_seconds))
+                    count_redis_round_trip("pipeline")
+                    await pipe.execute()
+                    return job, True
+                except WatchError:
+                    continue
+
+    async def queued(self) -> int:
+        count_redis_round_trip("get")
+        return int(await async_redis_client.get(self.queued_key) or 0)
+
+# ===== Job Manager =====
+
+class JobManager:
+    """Runs queued agent jobs on a bounded number of workers"""
+
+    def __init__(self, backend, concurrency: int = 2, cancel_poll_seconds: float = 1.0):
+        self.backend = backend
+        self.concurrency = concurrency
+        self.cancel_poll_seconds = cancel_poll_seconds
+        self._runner: Optional[AgentRunner] = None
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+
+    async def start(self, runner: AgentRunner) -> None:
+        """Start the worker loops"""
+        self._runner = runner
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        logger.info("Started %s job workers", self.concurrency)
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, message: str, user_id: str) -> Dict[str, Any]:
+        """Queue a task for a user; raises QueueFullError when there is no room"""
+        job = {
+            "id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "message": message,
+            "status": "queued",
+            "result": None,
+            "error": None,
+            "cached": False,
+            "cancel_requested": False,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        await self.backend.enqueue(job)
+        logger.info("Queued job %s for user %s", job['id'], user_id)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.backend.load(job_id)
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running job"""
+
+        def request_cancel(job: Dict[str, Any]) -> bool:
+            if job["status"] in FINISHED_STATUSES:
+                return False
+            if job["status"] == "queued":
+                job["status"] = "cancelled"
+                job["finished_at"] = time.time()
+            else:
+                # The worker running it (possibly in another process) picks this up
+                job["cancel_requested"] = True
+            return True
+
+        job, changed = await self.backend.update(job_id, request_cancel)
+        if not changed:
+            return job
+
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                job_id = await self.backend.dequeue(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error reading job queue: %s", e)
+                await asyncio.sleep(1.0)
+                continue
+            if job_id is None:
+                continue
+            try:
+                await self._process(job_id)
+            except asyncio.CancelledError:
+                # Shutting down: the entry stays pending so another worker can reclaim the job
+                raise
+            except Exception as e:
+                logger.error("Error processing job %s: %s", job_id, e)
+            await self.backend.ack(job_id)
+
+    async def _process(self, job_id: str) -> None:
+        def start(job: Dict[str, Any]) -> bool:
+            if job["status"] != "queued":
+                return False
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            return True
+
+        # Conditional so a job cancelled while it waited in the queue is never started
+        job, started = await self.backend.update(job_id, start)
+        if not started:
+            return
+
+        task = asyncio.create_task(self._execute(job["message"], job["user_id"]))
+        self._running[job_id] = task
+        try:
+            while not task.done():
+                await asyncio.wait({task}, timeout=self.cancel_poll_seconds)
+                if task.done():
+                    break
+                await self.backend.touch(job_id)
+                latest = await self.backend.load(job_id)
+                if latest is not None and latest.get("cancel_requested"):
+                    task.cancel()
+            result, cached = await task
+        except asyncio.CancelledError:
+            if not task.done():
+                # The worker itself is shutting down: hand the job back without using up an attempt
+                task.cancel()
+                await self._requeue(job_id)
+                raise
+            job["status"] = "cancelled"
+            logger.info("Cancelled job %s", job_id)
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+            logger.warning("Job %s failed: %s", job_id, e)
+        else:
+            response = result_to_response(result)
+            job["status"] = "done"
+            job["result"] = response
+            job["cached"] = cached
+            await store_conversation_history_async(job["user_id"], job["message"], response["message"])
+        finally:
+            self._running.pop(job_id, None)
+
+        job["finished_at"] = time.time()
+        await self.backend.save(job)
+
+    async def _requeue(self, job_id: str) -> None:
+        def requeue(job: Dict[str, Any]) -> bool:
+            if job["status"] != "running":
+                return False
+            job["status"] = "queued"
+            job["started_at"] = None
+            return True
+
+        try:
+            await self.backend.update(job_id, requeue)
+        except Exception as e:
+            logger.error("Error requeueing job %s: %s", job_id, e)
+
+    async def _execute(self, message: str, user_id: str) -> Tuple[str, bool]:
+        """Return (result, cached) for a task, serving it from the cache when possible"""
+        cached_response, freshness = await lookup_cached_response_async(message)
+        if cached_response is not None:
+            if freshness == "stale":
+                revalidate_in_background(message, self._runner)
+            return cached_response, True
+
+        result, cacheable = await self._runner(message, None if user_id == ANONYMOUS_USER_ID else user_id)
+        if cacheable:
+            await cache_fresh_response_async(message, result)
+        return result, False
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "concurrency": self.concurrency,
+            "queued": await self.backend.queued(),
+            "running": len(self._running),
+        }
+
+def _create_backend():
+    max_size = int(os.getenv("JOB_QUEUE_MAX_SIZE", "100"))
+    max_per_user = int(os.getenv("JOB_QUEUE_MAX_PER_USER", "5"))
+    result_ttl_seconds = float(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+    if os.getenv("JOB_QUEUE_BACKEND", "memory").lower() == "redis":
+        return RedisStreamJobBackend(
+            max_size,
+            max_per_user,
+            result_ttl_seconds,
+            claim_idle_seconds=float(os.getenv("JOB_CLAIM_IDLE_SECONDS", "60")),
+            max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+        )
+    return InMemoryJobBackend(max_size, max_per_user, result_ttl_seconds)
+
+job_manager = JobManager(
+    _create_backend(),
+    concurrency=int(os.getenv("JOB_WORKER_CONCURRENCY", "2")),
+)
@@ -1,11 +1,15 @@
-from fastapi import FastAPI
+import time
+# Measured from the first import so startup timings include loading the app's dependencies
+_import_started = time.perf_counter()
+
+from fastapi import BackgroundTasks, FastAPI, HTTPException
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from pydantic import BaseModel
 import os
-import time
-from browser_use import Agent, ChatGoogle
-from typing import Any, Dict, List, Optional
+import logging
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 from utils import (
     store_long_term_memory,
     get_long_term_memory,
@@ -13,13 +17,97 @@ from utils import (
     store_conversation_history,
     get_conversation_history,
     get_cached_response,
-    cache_response
+    cache_response,
+    get_cached_response_async,
+    local_response_cache,
+    normalize_prompt,
+    warm_up_clients_async,
+    close_clients_async,
 )
-import requests
+from freshness import (
+    cache_fresh_response_async,
+    freshness_stats,
+    lookup_cached_response_async,
+    lookup_cached_responses_async,
+    revalidate_in_background,
+)
+from memory import load_context_async, remember_run_async
+from singleflight import agent_singleflight
+from browser_pool import browser_pool
+from jobs import ANONYMOUS_USER_ID, QueueFullError, job_manager
+from metrics import TimingHeadersMiddleware, observe_agent_run, observe_startup
+from plans import PLAN_REPLAY_ENABLED, record_plan, store_plan_async, try_replay_plan
+from results import encode_result, get_full_history_async, result_to_response, store_full_history_async, summarize_history
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from contextlib import asynccontextmanager
 import json
+import uuid
+import asyncio
+
+if TYPE_CHECKING:
+    # browser_use takes seconds to import; it is loaded on the first agent run or by the prewarm
+    from browser_use import Agent, BrowserSession, ChatGoogle
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
 
 load_dotenv()
-app = FastAPI()
+
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+BROWSER_POOL_PREWARM = os.getenv("BROWSER_POOL_PREWARM", "true").lower() == "true"
+
+_browser_use_loaded = False
+
+def _load_browser_use() -> None:
+    # browser_use resolves these lazily on first attribute access, which is where the import time goes
+    from browser_use import Agent, BrowserProfile, BrowserSession, ChatGoogle  # noqa: F401
+    from browser_use.tools.service import Tools  # noqa: F401
+
+async def _import_browser_use() -> None:
+    """Import browser_use off the event loop so a cold first agent run does not stall cache hits"""
+    global _browser_use_loaded
+    if not _browser_use_loaded:
+        await asyncio.to_thread(_load_browser_use)
+        _browser_use_loaded = True
+
+async def _prewarm_agent_runtime() -> None:
+    """Import browser_use, create the LLM client and launch the browser pool without delaying startup"""
+    start = time.perf_counter()
+    try:
+        await _import_browser_use()
+        get_llm()
+        await browser_pool.start()
+    except Exception as e:
+        logger.error("Error prewarming the agent runtime: %s", e)
+    observe_startup("prewarm", time.perf_counter() - start)
+    logger.info("Agent runtime prewarmed in %.0f ms", (time.perf_counter() - start) * 1000)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start = time.perf_counter()
+    await warm_up_clients_async()
+    await job_manager.start(runner=_run_shared_agent_task)
+    # Cache hits are served right away; agent runs started before the prewarm finishes wait on the import lock
+    prewarm = asyncio.create_task(_prewarm_agent_runtime()) if BROWSER_POOL_PREWARM else None
+    observe_startup("import", IMPORT_SECONDS)
+    observe_startup("lifespan", time.perf_counter() - start)
+    logger.info(
+        "Server ready: imports took %.0f ms, startup %.0f ms",
+        IMPORT_SECONDS * 1000, (time.perf_counter() - start) * 1000,
+    )
+    yield
+    if prewarm is not None and not prewarm.done():
+        prewarm.cancel()
+        await asyncio.gather(prewarm, return_exceptions=True)
+    await job_manager.stop()
+    await browser_pool.close()
+    await close_clients_async()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -28,11 +116,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all methods
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["Server-Timing", "X-Response-Time-Ms"],
 )
 
+# Per-request phase timings as response headers
+if os.getenv("METRICS_TIMING_HEADERS", "false").lower() == "true":
+    app.add_middleware(TimingHeadersMiddleware)
+
 # Request models
 class ChatRequest(BaseModel):
     message: str
+    # Enables per-user memory: context is injected into agent runs and results are remembered
+    user_id: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    tasks: List[str]
+    user_id: Optional[str] = None
+
+class JobRequest(BaseModel):
+    message: str
+    user_id: str = ANONYMOUS_USER_ID
 
 @app.get("/")
 def read_root():
@@ -65,9 +168,13 @@ def _format_agent_step(action: Any, index: int) -> Dict[str, Any]:
         "success": getattr(action, "success", None),
     }
 
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/test/utils")
 async def test_utils():
-    print('new one!!')
+    logger.debug('Running utils test')
     # Create real test calls 
     # store_long_term_memory('hello', 'test', 'test')
     # get_long_term_memory('hello', 'test')
@@ -85,57 +192,149 @@ async def test_utils():
     # response_string = str(dummy_json)
     # cache_response('Find the number 1 post on Show HN', response_string)
 
-    c = get_cached_response('Find the number 1 post on Show HN')
-    print('cached_response: ', c)
+    c = await get_cached_response_async('Find the number 1 post on Show HN')
+    logger.debug('cached_response: %s', c)
     return {
         "message": "Utils test complete",
         "success": True,
     }
 
 
+_llm: Optional["ChatGoogle"] = None
+
+def get_llm() -> "ChatGoogle":
+    """Return the LLM client shared by every agent run"""
+    global _llm
+    if _llm is None:
+        from browser_use import ChatGoogle
+        _llm = ChatGoogle(model="gemini-flash-latest", api_key=os.getenv("GOOGLE_API_KEY"))
+    return _llm
+
+async def _run_agent_task(
+    message: str,
+    on_step: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    context: Optional[str] = None,
+    browser_session: Optional["BrowserSession"] = None,
+) -> str:
+    """Run a browser agent for a task and return its compact result payload; leases a pooled browser unless given one"""
+    await _import_browser_use()
+    if browser_session is None:
+        async with browser_pool.lease() as leased_session:
+            return await _run_agent_task(message, on_step, context, leased_session)
+
+    steps_emitted = 0
+
+    async def on_step_end(agent: "Agent") -> None:
+        nonlocal steps_emitted
+        if not agent.history.history:
+            return
+        for action in agent.history.history[-1].result:
+            steps_emitted += 1
+            await on_step(_format_agent_step(action, steps_emitted))
+
+    async def on_replay_result(action: Any) -> None:
+        nonlocal steps_emitted
+        steps_emitted += 1
+        await on_step(_format_agent_step(action, steps_emitted))
+
+    # Repeated tasks replay their recorded actions; the agent only runs when a step fails validation
+    replayed = await try_replay_plan(
+        message, browser_session, get_llm(), on_result=on_replay_result if on_step else None
+    )
+    if replayed is not None:
+        return encode_result(replayed)
+
+    from browser_use import Agent
+
+    agent = Agent(
+        task=message,
+        llm=get_llm(),
+        browser_session=browser_session,
+        extend_system_message=context,
+    )
+    start = time.perf_counter()
+    try:
+        result = await agent.run(on_step_end=on_step_end if on_step else None)
+    except Exception:
+        observe_agent_run(agent.history, time.perf_counter() - start, "error")
+        raise
+    observe_agent_run(result, time.perf_counter() - start, "completed")
+
+    # Plans are replayed for everyone, so only runs without a user's context are recorded
+    if PLAN_REPLAY_ENABLED and context is None:
+        plan = record_plan(message, result)
+        if plan is not None:
+            await store_plan_async(plan)
+
+    # Keep the full history out of the cache payload; it is expanded on request
+    history_id = uuid.uuid4().hex
+    await store_full_history_async(history_id, result)
+    return encode_result(summarize_history(result, history_id))
+
+async def _run_shared_agent_task(
+    message: str,
+    user_id: Optional[str] = None,
+    on_step: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    browser_session: Optional["BrowserSession"] = None,
+) -> Tuple[str, bool]:
+    """Run a task through the single-flight layer; returns (result, cacheable)"""
+    context = await load_context_async(user_id, message) if user_id else None
+    # A run built on one user's memories is only shared with that user's own requests and never cached.
+    # A run in the caller's own browser session is never joined: the caller closes that session when it
+    # leaves, even if others are still waiting on the run. Steps go to every caller waiting on the run
+    result, shared = await agent_singleflight.do(
+        message,
+        lambda emit: _run_agent_task(message, on_step=emit, context=context, browser_session=browser_session),
+        scope=user_id if context else None,
+        joinable=browser_session is None,
+        on_progress=on_step,
+    )
+    return result, not shared and context is None
+
+def _serve_cached(message: str, cached_response: str, freshness: str) -> Dict[str, Any]:
+    logger.debug("✓ Cache HIT (%s) for query: %s...", freshness, message[:50])
+    if freshness == "stale":
+        # Answer from the stale entry now; the refreshed one serves later requests
+        revalidate_in_background(message, _run_shared_agent_task)
+    return {**result_to_response(cached_response), "success": True, "freshness": freshness}
+
 @app.post("/agent/chat")
-async def chat_with_agent(request: ChatRequest):
+async def chat_with_agent(request: ChatRequest, background_tasks: BackgroundTasks):
     message = request.message
-    print(f"Received message: {message}")
+    logger.debug("Received message: %s", message)
 
-    # LangCache Semantic Caching
-    cached_response = get_cached_response(message)
+    # LangCache Semantic Caching; expired entries come back as a miss
+    cached_response, freshness = await lookup_cached_response_async(message)
 
-    print('cached response: ', cached_response)
-    # Only treat as cache hit if response is not None and not empty
-    if cached_response is not None and cached_response != "" and cached_response != "data=[]":
-        print('cached_response: ', cached_response[:10])
-        print(f"✓ Cache HIT for query: {message[:50]}...")
-        return {
-            "message": cached_response,
-            "success": True,
-        }
+    if cached_response is not None:
+        response = _serve_cached(message, cached_response, freshness)
+        if request.user_id:
+            background_tasks.add_task(remember_run_async, request.user_id, message, response, learned=False)
+        return response
         
     else:
-        print(f"✗ Cache MISS for query: {message[:50]}...")
+        logger.debug("✗ Cache %s for query: %s...", freshness.upper(), message[:50])
 
         try:
-            llm = ChatGoogle(model="gemini-flash-latest", api_key=os.getenv("GOOGLE_API_KEY"))
-            agent = Agent(task=message, llm=llm)
-
-            result = await agent.run()
+            # Concurrent duplicates of this task share a single agent run
+            result_message, cacheable = await _run_shared_agent_task(message, request.user_id)
             
-            # Return the result as a message string
-            result_message = str(result) if result else "Agent execution completed."
-            
-            print('result message: ', result_message)
-            print('result message type: ', type(result_message))
+            logger.debug("result message: %s", result_message)
 
-            # Cache the response
-            cache_response(message, result_message)
-            
-            return {
-                "message": result_message,
+            # Cache the response after it has been sent to the client
+            if cacheable:
+                background_tasks.add_task(cache_fresh_response_async, message, result_message)
+
+            response = {
+                **result_to_response(result_message),
                 "success": True,
             }
+            if request.user_id:
+                background_tasks.add_task(remember_run_async, request.user_id, message, response)
+            return response
             
         except Exception as e:
-            print(f'Error executing agent: {e}')
+            logger.error("Error executing agent: %s", e)
 
             return {
                 "message": f"Sorry, I encountered an error: {str(e)}",
@@ -143,18 +342,209 @@ async def chat_with_agent(request: ChatRequest):
                 "error": str(e),
             }
 
+# Strong references to detached agent runs so they are not garbage collected
+_background_runs: set = set()
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _stream_agent_events(message: str, user_id: Optional[str] = None) -> AsyncIterator[str]:
+    """Yield SSE events for each agent step as it completes, then the final result"""
+    cached_response, freshness = await lookup_cached_response_async(message)
+    if cached_response is not None:
+        response = _serve_cached(message, cached_response, freshness)
+        yield _sse_event("result", {**response, "cached": True})
+        if user_id:
+            await remember_run_async(user_id, message, response, learned=False)
+        return
+
+    logger.debug("✗ Cache %s for query: %s...", freshness.upper(), message[:50])
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def on_step(step: Dict[str, Any]) -> None:
+        await events.put(("step", step))
+
+    async def run() -> None:
+        try:
+            result_message, cacheable = await _run_shared_agent_task(message, user_id, on_step=on_step)
+        except Exception as e:
+            logger.error("Error executing agent: %s", e)
+            await events.put(("error", {
+                "message": f"Sorry, I encountered an error: {str(e)}",
+                "success": False,
+                "error": str(e),
+            }))
+            return
+        response = {**result_to_response(result_message), "success": True}
+        await events.put(("result", {**response, "cached": False}))
+        # The client already has the result; cache it without holding up the stream
+        if cacheable:
+            await cache_fresh_response_async(message, result_message)
+        if user_id:
+            await remember_run_async(user_id, message, response)
+
+    # The run is not tied to the connection so a disconnect still fills the cache
+    task = asyncio.create_task(run())
+    _background_runs.add(task)
+    task.add_done_callback(_background_runs.discard)
+    while True:
+        event, data = await events.get()
+        yield _sse_event(event, data)
+        if event != "step":
+            return
+
+@app.post("/agent/chat/stream")
+async def stream_chat_with_agent(request: ChatRequest):
+    logger.debug("Received streaming message: %s", request.message)
+    return StreamingResponse(
+        _stream_agent_events(request.message, request.user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ===== Batch Fan-Out =====
+
+BATCH_MAX_TASKS = int(os.getenv("BATCH_MAX_TASKS", "20"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+
+def _validate_batch(request: BatchRequest) -> None:
+    if not request.tasks:
+        raise HTTPException(status_code=400, detail="No tasks given")
+    if len(request.tasks) > BATCH_MAX_TASKS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_TASKS} tasks per batch")
+
+async def _run_batch(tasks: List[str], user_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Yield each task's result as it completes: cache hits first, then agent runs in tabs of one shared browser"""
+    # Misses grouped by normalized task so duplicates in a batch share one run
+    misses: Dict[str, List[int]] = {}
+    for index, (task, (cached_response, freshness)) in enumerate(zip(tasks, await lookup_cached_responses_async(tasks))):
+        if cached_response is not None:
+            yield {"index": index, "task": task, **_serve_cached(task, cached_response, freshness), "cached": True}
+        else:
+            misses.setdefault(normalize_prompt(task), []).append(index)
+    if not misses:
+        return
+
+    completions: asyncio.Queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def run(indexes: List[int], browser_session: "BrowserSession") -> None:
+        task = tasks[indexes[0]]
+        try:
+            async with semaphore, browser_pool.tab(browser_session) as tab_session:
+                result_message, cacheable = await _run_shared_agent_task(
+                    task, user_id, browser_session=tab_session
+                )
+            if cacheable:
+                await cache_fresh_response_async(task, result_message)
+            completion = {**result_to_response(result_message), "success": True}
+            if user_id:
+                await remember_run_async(user_id, task, completion)
+        except Exception as e:
+            logger.error("Error executing agent for batch task %r: %s", task[:50], e)
+            completion = {
+                "message": f"Sorry, I encountered an error: {str(e)}",
+                "success": False,
+                "error": str(e),
+            }
+        for index in indexes:
+            await completions.put({"index": index, "task": tasks[index], **completion, "cached": False})
+
+    await _import_browser_use()
+    async with browser_pool.lease() as browser_session:
+        runs = [asyncio.create_task(run(indexes, browser_session)) for indexes in misses.values()]
+        try:
+            for _ in range(sum(len(indexes) for indexes in misses.values())):
+                yield await completions.get()
+        finally:
+            # Only reached early if the client went away; the browser goes back to the pool
+            for pending in runs:
+                pending.cancel()
+            await asyncio.gather(*runs, return_exceptions=True)
+
+def _aggregate_batch(completions: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    results = sorted(completions, key=lambda completion: completion["index"])
+    succeeded = sum(1 for completion in results if completion["success"])
+    return {
+        "results": results,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "cached": sum(1 for completion in results if completion["cached"]),
+        "elapsed_seconds": round(elapsed, 3),
+        "success": succeeded == len(results),
+    }
+
+@app.post("/agent/batch")
+async def batch_agent_tasks(request: BatchRequest):
+    _validate_batch(request)
+    start = time.perf_counter()
+    completions = [completion async for completion in _run_batch(request.tasks, request.user_id)]
+    return _aggregate_batch(completions, time.perf_counter() - start)
+
+async def _stream_batch_events(tasks: List[str], user_id: Optional[str] = None) -> AsyncIterator[str]:
+    start = time.perf_counter()
+    completions: List[Dict[str, Any]] = []
+    async for completion in _run_batch(tasks, user_id):
+        completions.append(completion)
+        yield _sse_event("task", completion)
+    yield _sse_event("result", _aggregate_batch(completions, time.perf_counter() - start))
+
+@app.post("/agent/batch/stream")
+async def stream_batch_agent_tasks(request: BatchRequest):
+    _validate_batch(request)
+    return StreamingResponse(
+        _stream_batch_events(request.tasks, request.user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {"local": local_response_cache.stats(), "freshness": freshness_stats()}
+
+@app.get("/agent/history/{history_id}")
+async def get_agent_history(history_id: str):
+    history = await get_full_history_async(history_id)
+    if history is None:
+        raise HTTPException(status_code=404, detail="History not found")
+    return history
+
+@app.post("/agent/jobs", status_code=202)
+async def submit_agent_job(request: JobRequest):
+    try:
+        job = await job_manager.submit(request.message, request.user_id)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return job
+
+@app.get("/agent/jobs/{job_id}")
+async def get_agent_job(job_id: str):
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.delete("/agent/jobs/{job_id}")
+async def cancel_agent_job(job_id: str):
+    job = await job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @app.get("/agent/execute")
 async def execute_agent():
-    print('agent executed')
-    print('GOOGLE_API_KEY: ', os.getenv("GOOGLE_API_KEY"))
+    logger.info("agent executed")
 
-    llm = ChatGoogle(model="gemini-flash-latest", api_key=os.getenv("GOOGLE_API_KEY"))
     task = "Find the number 1 post on Show HN"
-    agent = Agent(task=task, llm=llm)
 
     try:
-        result = await agent.run()
-        print('result: ', result)
+        await _import_browser_use()
+        from browser_use import Agent
+
+        async with browser_pool.lease() as browser_session:
+            agent = Agent(task=task, llm=get_llm(), browser_session=browser_session)
+            result = await agent.run()
+        logger.debug('result: %s', result)
     
         return {
             "summary": result,
@@ -162,7 +552,7 @@ async def execute_agent():
             "success": True,
         }
     except Exception as e:
-        print('error: ', e)
+        logger.error('error: %s', e)
         return {
             "summary": "Error executing agent",
             "steps": [],
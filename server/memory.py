@@ -0,0 +1,99 @@
+import os
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+from utils import HashingEmbedder, get_user_context_async, store_user_context_async
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ===== Memory-Augmented Agent Context =====
+
+MEMORY_CONTEXT_TOKEN_BUDGET = int(os.getenv("MEMORY_CONTEXT_TOKEN_BUDGET", "600"))
+MEMORY_HISTORY_LIMIT = int(os.getenv("MEMORY_HISTORY_LIMIT", "20"))
+MEMORY_MIN_RELEVANCE = float(os.getenv("MEMORY_MIN_RELEVANCE", "0.15"))
+# Longest memory or history line injected, in characters
+MEMORY_ITEM_MAX_CHARS = 300
+
+CONTEXT_HEADER = (
+    "Context from this user's previous sessions, most relevant first. Use it to skip steps "
+    "that are already known (e.g. go straight to a known URL), but re-check anything time-sensitive:"
+)
+
+_embedder = HashingEmbedder()
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return max(1, len(text) // 4)
+
+def _clip(text: str) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= MEMORY_ITEM_MAX_CHARS else text[:MEMORY_ITEM_MAX_CHARS - 3] + "..."
+
+def rank_context(task: str, memories: Dict[str, str], history: List[Dict]) -> List[Tuple[float, str]]:
+    """Score memories and past tasks by similarity to the task; recent history breaks ties"""
+    items = [_clip(f"{key}: {value}") for key, value in memories.items()]
+    recency = [0.0] * len(items)
+    for position, entry in enumerate(history, start=1):
+        items.append(_clip(f'Earlier task "{entry.get("task", "")}" -> {entry.get("result", "")}'))
+        recency.append(position / len(history))
+    if not items:
+        return []
+
+    import numpy as np
+    vectors = _embedder.embed([task] + items)
+    norms = np.linalg.norm(vectors, axis=1)
+    norms[norms == 0] = 1.0
+    vectors /= norms[:, None]
+    similarities = vectors[1:] @ vectors[0]
+    scored = [
+        (float(similarity) + 0.05 * bonus, item)
+        for similarity, bonus, item in zip(similarities, recency, items)
+        if similarity >= MEMORY_MIN_RELEVANCE
+    ]
+    scored.sort(key=lambda pair: pair[0], reverse=True)
+    return scored
+
+def build_context(
+    task: str,
+    memories: Dict[str, str],
+    history: List[Dict],
+    token_budget: int = MEMORY_CONTEXT_TOKEN_BUDGET,
+) -> Optional[str]:
+    """Pack the most relevant items into a context block that fits the token budget"""
+    used = estimate_tokens(CONTEXT_HEADER)
+    lines: List[str] = []
+    for _, item in rank_context(task, memories, history):
+        line = f"- {item}"
+        cost = estimate_tokens(line)
+        if used + cost > token_budget:
+            continue
+        lines.append(line)
+        used += cost
+    if not lines:
+        return None
+    return "\n".join([CONTEXT_HEADER] + lines)
+
+async def load_context_async(user_id: str, task: str) -> Optional[str]:
+    """Fetch a user's memories and recent history in one round trip and build the context for a task"""
+    memories, history = await get_user_context_async(user_id, MEMORY_HISTORY_LIMIT)
+    context = build_context(task, memories, history)
+    if context:
+        logger.debug("Injecting %s tokens of context for user %s", estimate_tokens(context), user_id)
+    return context
+
+def learned_memories(task: str, response: Dict[str, Any]) -> Dict[str, str]:
+    """Memories worth keeping from a successful run: the page the answer was found on, one per site"""
+    urls = response.get("urls") or []
+    host = urlparse(urls[-1]).hostname if urls else None
+    if not host:
+        return {}
+    # Keyed by site so the hash stays bounded; task-level detail lives in the history
+    return {f"site {host}": f'{urls[-1]} answered "{_clip(task)}"'}
+
+async def remember_run_async(user_id: str, task: str, response: Dict[str, Any], learned: bool = True) -> bool:
+    """Add a task to the user's history and, for successful agent runs, store what it learned"""
+    memories = learned_memories(task, response) if learned else {}
+    return await store_user_context_async(user_id, task, response["message"], memories)
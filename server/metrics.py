@@ -0,0 +1,133 @@
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from prometheus_client import Counter, Gauge, Histogram
+
+# ===== Prometheus Metrics =====
+
+CACHE_LOOKUP_SECONDS = Histogram(
+    "cache_lookup_seconds",
+    "Cache lookup latency by tier",
+    ["tier"],
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Cache lookups by tier and outcome (hit, miss, error)",
+    ["tier", "outcome"],
+)
+CACHE_FRESHNESS = Counter(
+    "cache_freshness_total",
+    "Cache lookups by entry freshness (fresh, stale, expired, miss)",
+    ["state"],
+)
+CACHE_REVALIDATIONS = Counter(
+    "cache_revalidations_total",
+    "Background refreshes of stale cache entries by outcome (refreshed, error)",
+    ["outcome"],
+)
+AGENT_RUN_SECONDS = Histogram(
+    "agent_run_seconds",
+    "Browser agent run duration",
+    ["outcome"],
+    buckets=(1, 2, 5, 10, 20, 30, 45, 60, 90, 120, 180, 300),
+)
+AGENT_STEP_SECONDS = Histogram(
+    "agent_step_seconds",
+    "Browser agent step duration from the history step metadata",
+    buckets=(0.5, 1, 2, 3, 5, 7.5, 10, 15, 20, 30, 60),
+)
+AGENT_LLM_CALLS = Counter(
+    "agent_llm_calls_total",
+    "LLM calls made by browser agent runs",
+)
+PLAN_REPLAYS = Counter(
+    "agent_plan_replays_total",
+    "Recorded action-plan replays by outcome (replayed, failed)",
+    ["outcome"],
+)
+REDIS_ROUND_TRIPS = Counter(
+    "redis_round_trips_total",
+    "Redis round trips by operation",
+    ["operation"],
+)
+STARTUP_SECONDS = Gauge(
+    "server_startup_seconds",
+    "Time spent starting this process by phase (import, lifespan, prewarm)",
+    ["phase"],
+)
+
+def observe_cache_lookup(tier: str, outcome: str, seconds: float) -> None:
+    CACHE_LOOKUP_SECONDS.labels(tier).observe(seconds)
+    CACHE_LOOKUPS.labels(tier, outcome).inc()
+    record_phase(f"cache_{tier}", seconds)
+
+def count_cache_freshness(state: str) -> None:
+    CACHE_FRESHNESS.labels(state).inc()
+
+def count_cache_revalidation(outcome: str) -> None:
+    CACHE_REVALIDATIONS.labels(outcome).inc()
+
+def observe_agent_run(history: Any, seconds: float, outcome: str) -> None:
+    """Record run duration, per-step durations and LLM calls from an agent history"""
+    AGENT_RUN_SECONDS.labels(outcome).observe(seconds)
+    record_phase("agent", seconds)
+    for item in getattr(history, "history", None) or []:
+        metadata = getattr(item, "metadata", None)
+        if metadata is not None and metadata.step_end_time and metadata.step_start_time:
+            AGENT_STEP_SECONDS.observe(metadata.step_end_time - metadata.step_start_time)
+        if getattr(item, "model_output", None) is not None:
+            AGENT_LLM_CALLS.inc()
+
+def observe_plan_replay(outcome: str, seconds: float) -> None:
+    PLAN_REPLAYS.labels(outcome).inc()
+    record_phase("replay", seconds)
+
+def count_redis_round_trip(operation: str) -> None:
+    REDIS_ROUND_TRIPS.labels(operation).inc()
+
+def observe_startup(phase: str, seconds: float) -> None:
+    STARTUP_SECONDS.labels(phase).set(seconds)
+
+# ===== Per-Request Timing Headers =====
+
+_request_phases: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_phases", default=None)
+
+def record_phase(name: str, seconds: float) -> None:
+    """Add time spent in a phase to the current request's timing header"""
+    phases = _request_phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+class TimingHeadersMiddleware:
+    """ASGI middleware adding Server-Timing and X-Response-Time-Ms headers to each response"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        phases: Dict[str, float] = {}
+        token = _request_phases.set(phases)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - start) * 1000
+                server_timing = ", ".join(
+                    f"{name};dur={seconds * 1000:.3f}" for name, seconds in phases.items()
+                )
+                headers = list(message.get("headers", []))
+                headers.append((b"x-response-time-ms", f"{total_ms:.3f}".encode()))
+                if server_timing:
+                    headers.append((b"server-timing", server_timing.encode()))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_phases.reset(token)
@@ -0,0 +1,290 @@
+"""
+Offline Server Benchmark: concurrent load against the FastAPI app with local stand-ins
+
+Drives /agent/chat at set cache hit ratios with a fake browser agent, an in-memory
+LangCache double and fakeredis, so it needs no API keys, network or browser.
+Reports p50/p95/p99 latency, throughput and event-loop lag as JSON.
+
+    uv run --group dev python offline_benchmark.py --requests 500 --concurrency 50 --hit-ratios 0,0.5,0.9
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+
+# ===== Stand-ins =====
+
+class FakeLangCache:
+    """In-memory LangCache double with exact-match lookups and a simulated round trip"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.entries: Dict[str, str] = {}
+
+    def _result(self, prompt: str):
+        response = self.entries.get(prompt)
+        data = [SimpleNamespace(response=response)] if response is not None else []
+        return SimpleNamespace(data=data)
+
+    def search(self, *, prompt: str, **kwargs):
+        time.sleep(self.latency)
+        return self._result(prompt)
+
+    async def search_async(self, *, prompt: str, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._result(prompt)
+
+    def set(self, *, prompt: str, response: str, **kwargs):
+        time.sleep(self.latency)
+        self.entries[prompt] = response
+        return True
+
+    async def set_async(self, *, prompt: str, response: str, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.entries[prompt] = response
+        return True
+
+def make_fake_browser_session():
+    """Browser session double specced from the real BrowserSession, so calls to APIs it lacks fail here too"""
+    from unittest.mock import AsyncMock, MagicMock
+    from browser_use import BrowserSession
+
+    # A plain spec (async methods become AsyncMocks) costs ~1ms; create_autospec walks every
+    # method signature and blocked the event loop for ~0.3s per session under load
+    session = MagicMock(spec=BrowserSession)
+    # Pydantic fields and properties are not part of the class spec
+    session.agent_focus = SimpleNamespace(target_id="fake-target")
+    session.cdp_client = MagicMock(send=AsyncMock())
+    session.get_or_create_cdp_session.return_value = SimpleNamespace(cdp_client=session.cdp_client, session_id="fake-session")
+    session.get_current_page_url.return_value = "about:blank"
+    session.get_tabs.return_value = []
+    return session
+
+def make_fake_agent(steps: int, step_latency: float):
+    """Build an Agent double that takes `steps` steps of `step_latency` seconds each"""
+
+    class FakeAgent:
+        def __init__(self, task: str, llm: Any = None, browser_session: Any = None, **kwargs):
+            self.task = task
+            self.history = SimpleNamespace(history=[])
+
+        async def run(self, on_step_end=None, **kwargs):
+            for step in range(1, steps + 1):
+                start = time.time()
+                await asyncio.sleep(step_latency)
+                self.history.history.append(SimpleNamespace(
+                    model_output=SimpleNamespace(),
+                    result=[SimpleNamespace(
+                        extracted_content=f"Step {step} of {self.task}",
+                        is_done=step == steps,
+                        success=True if step == steps else None,
+                    )],
+                    metadata=SimpleNamespace(step_start_time=start, step_end_time=time.time(), step_number=step),
+                ))
+                if on_step_end is not None:
+                    await on_step_end(self)
+            self.history.final_result = lambda: f"Result for: {self.task}"
+            self.history.is_successful = lambda: True
+            return self.history
+
+    return FakeAgent
+
+def install_stand_ins(args, fake_agent: bool = True) -> Dict[str, Any]:
+    """Import the server with every external dependency replaced by a local double"""
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Keep stdout clean for the JSON report
+    os.environ.setdefault("BROWSER_USE_SETUP_LOGGING", "false")
+    os.environ["CACHE_BACKEND"] = "langcache"
+    os.environ["BROWSER_POOL_PREWARM"] = "false"
+    os.environ["BROWSER_POOL_SIZE"] = str(args.pool_size)
+    os.environ["LOCAL_CACHE_MAX_SIZE"] = str(args.local_cache_size)
+
+    import fakeredis
+    import utils
+    import singleflight
+    import jobs
+    import results
+    import plans
+    import freshness
+    import main
+
+    fake_async_redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    utils.redis_client = fakeredis.FakeRedis(decode_responses=True)
+    utils.async_redis_client = fake_async_redis
+    singleflight.async_redis_client = fake_async_redis
+    jobs.async_redis_client = fake_async_redis
+    results.async_redis_client = fake_async_redis
+    plans.async_redis_client = fake_async_redis
+
+    langcache = FakeLangCache(args.langcache_latency)
+    utils.langcache_client = langcache
+
+    if fake_agent:
+        # main imports these from browser_use when an agent first runs
+        import browser_use
+        browser_use.Agent = make_fake_agent(args.steps, args.step_latency)
+        browser_use.ChatGoogle = lambda **kwargs: SimpleNamespace()
+    main.browser_pool._new_session = make_fake_browser_session
+    main.browser_pool._attach_session = lambda browser_session: make_fake_browser_session()
+
+    return {"main": main, "utils": utils, "freshness": freshness, "langcache": langcache}
+
+
+# ===== Measurement =====
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+async def monitor_loop_lag(samples: List[float], stop: asyncio.Event, interval: float = 0.01) -> None:
+    """Sample how late the event loop wakes up from a fixed sleep"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - start - interval))
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "max_ms": max(latencies) * 1000 if latencies else 0.0,
+    }
+
+async def run_scenario(client, stand_ins: Dict[str, Any], hit_ratio: float, args, rng: random.Random) -> Dict[str, Any]:
+    """Send args.requests chat requests at args.concurrency with the given cache hit ratio"""
+    utils = stand_ins["utils"]
+    freshness = stand_ins["freshness"]
+    utils.local_response_cache.clear()
+    stand_ins["langcache"].entries.clear()
+
+    hot_prompts = [f"Find the number {i} post on Show HN" for i in range(args.hot_prompts)]
+    for prompt in hot_prompts:
+        stand_ins["langcache"].entries[prompt] = freshness.wrap_entry(
+            f"Cached result for: {prompt}", freshness.classify_task(prompt)
+        )
+
+    prompts = [
+        rng.choice(hot_prompts) if rng.random() < hit_ratio else f"Cold task {hit_ratio} #{i}"
+        for i in range(args.requests)
+    ]
+
+    latencies: List[float] = []
+    hit_latencies: List[float] = []
+    miss_latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def send(prompt: str) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/agent/chat", json={"message": prompt})
+            duration = time.perf_counter() - start
+        latencies.append(duration)
+        if response.status_code != 200 or not response.json().get("success"):
+            errors += 1
+        elif response.json()["message"].startswith("Cached result"):
+            hit_latencies.append(duration)
+        else:
+            miss_latencies.append(duration)
+
+    lag_samples: List[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(lag_samples, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(send(prompt) for prompt in prompts))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+
+    return {
+        "hit_ratio": hit_ratio,
+        "requests": args.requests,
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "throughput_rps": args.requests / elapsed if elapsed > 0 else 0.0,
+        "latency": summarize(latencies),
+        "hit_latency": summarize(hit_latencies),
+        "miss_latency": summarize(miss_latencies),
+        "hits": len(hit_latencies),
+        "misses": len(miss_latencies),
+        "event_loop_lag": {
+            "p99_ms": percentile(lag_samples, 99) * 1000,
+            "max_ms": max(lag_samples) * 1000 if lag_samples else 0.0,
+        },
+        "local_cache": utils.local_response_cache.stats(),
+    }
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    import httpx
+
+    stand_ins = install_stand_ins(args)
+    app = stand_ins["main"].app
+    rng = random.Random(args.seed)
+
+    scenarios = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for hit_ratio in args.hit_ratios:
+                scenarios.append(await run_scenario(client, stand_ins, hit_ratio, args, rng))
+
+    return {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "steps": args.steps,
+            "step_latency_s": args.step_latency,
+            "langcache_latency_s": args.langcache_latency,
+            "pool_size": args.pool_size,
+            "local_cache_size": args.local_cache_size,
+            "hot_prompts": args.hot_prompts,
+            "seed": args.seed,
+        },
+        "python": sys.version.split()[0],
+        "scenarios": scenarios,
+    }
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline load benchmark for the agent server")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent in-flight requests")
+    parser.add_argument("--hit-ratios", type=lambda s: [float(x) for x in s.split(",")], default=[0.0, 0.5, 0.9],
+                        help="comma-separated cache hit ratios, one scenario each")
+    parser.add_argument("--hot-prompts", type=int, default=10, help="number of distinct cached prompts")
+    parser.add_argument("--steps", type=int, default=3, help="steps per fake agent run")
+    parser.add_argument("--step-latency", type=float, default=0.05, help="seconds per fake agent step")
+    parser.add_argument("--langcache-latency", type=float, default=0.02, help="simulated LangCache round trip in seconds")
+    parser.add_argument("--pool-size", type=int, default=4, help="browser pool size (bounds leased browsers)")
+    parser.add_argument("--local-cache-size", type=int, default=1024, help="local LRU size, 0 disables the tier")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    report = asyncio.run(run_benchmark(args))
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
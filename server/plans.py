@@ -0,0 +1,287 @@
+import os
+import re
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+from pydantic import BaseModel
+from utils import async_redis_client, normalize_prompt
+from metrics import count_redis_round_trip, observe_plan_replay
+from results import AgentResult, StepSummary, pack_payload, unpack_payload
+
+if TYPE_CHECKING:
+    from browser_use import BrowserSession
+    from browser_use.tools.service import Tools
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ===== Recorded Action Plans =====
+
+PLAN_REPLAY_ENABLED = os.getenv("PLAN_REPLAY_ENABLED", "true").lower() == "true"
+PLAN_TTL_SECONDS = int(os.getenv("PLAN_TTL_SECONDS", "604800"))
+PLAN_ACTION_TIMEOUT_SECONDS = float(os.getenv("PLAN_ACTION_TIMEOUT_SECONDS", "30"))
+
+# Actions that change the page and can be re-executed without the LLM
+REPLAYABLE_ACTIONS = {
+    "navigate", "search", "go_back", "click", "input", "scroll",
+    "send_keys", "select_dropdown", "wait", "find_text",
+}
+# Actions that leave the page as it was; dropped from plans
+SKIPPED_ACTIONS = {
+    "done", "extract", "screenshot", "dropdown_options", "find_elements",
+    "search_page", "read_file", "write_file", "replace_file",
+}
+# Element attributes used to find the recorded element again when its XPath changed
+IDENTIFYING_ATTRIBUTES = ("id", "name", "aria-label", "href", "placeholder", "title", "type")
+
+class PlanReplayError(Exception):
+    """Raised when a replayed step fails validation"""
+
+class PlanElement(BaseModel):
+    node_name: str
+    x_path: str
+    attributes: Dict[str, str] = {}
+
+class PlanStep(BaseModel):
+    action: str
+    params: Dict[str, Any]
+    # Page the action was taken on in the recorded run
+    url: Optional[str] = None
+    element: Optional[PlanElement] = None
+
+class ActionPlan(BaseModel):
+    task: str
+    steps: List[PlanStep]
+    final_url: Optional[str] = None
+    recorded_at: float
+
+def _plan_key(task: str) -> str:
+    digest = hashlib.sha256(normalize_prompt(task).encode("utf-8")).hexdigest()
+    return f"agent_plan:{digest}"
+
+def _host(url: Optional[str]) -> Optional[str]:
+    if not url or url == "about:blank":
+        return None
+    return urlparse(url).hostname
+
+def _element_fingerprint(element: Any) -> PlanElement:
+    attributes = getattr(element, "attributes", None) or {}
+    return PlanElement(
+        node_name=element.node_name,
+        x_path=element.x_path,
+        attributes={name: attributes[name] for name in IDENTIFYING_ATTRIBUTES if attributes.get(name)},
+    )
+
+def record_plan(task: str, history: Any) -> Optional[ActionPlan]:
+    """Build a replayable plan from a successful agent history; None if it cannot be replayed"""
+    if not history.is_successful():
+        return None
+
+    steps: List[PlanStep] = []
+    final_url = None
+    for item in history.history:
+        state = getattr(item, "state", None)
+        url = getattr(state, "url", None)
+        if _host(url):
+            final_url = url
+        model_output = getattr(item, "model_output", None)
+        if model_output is None:
+            continue
+        results = item.result or []
+        elements = getattr(state, "interacted_element", None) or []
+        for position, action in enumerate(getattr(model_output, "action", None) or []):
+            name, params = next(
+                ((name, params) for name, params in action.model_dump(exclude_unset=True).items() if params is not None),
+                (None, None),
+            )
+            if name is None or name in SKIPPED_ACTIONS:
+                continue
+            if name not in REPLAYABLE_ACTIONS:
+                logger.debug("Not recording plan for %r: %s cannot be replayed", task[:50], name)
+                return None
+            if position < len(results) and results[position].error:
+                continue
+            element = elements[position] if position < len(elements) else None
+            if params.get("index") is not None and element is None:
+                return None
+            steps.append(PlanStep(
+                action=name,
+                params=params,
+                url=url,
+                element=_element_fingerprint(element) if params.get("index") is not None else None,
+            ))
+
+    if not steps:
+        return None
+    return ActionPlan(task=task, steps=steps, final_url=final_url, recorded_at=time.time())
+
+# ===== Plan Storage =====
+
+async def store_plan_async(plan: ActionPlan) -> bool:
+    try:
+        count_redis_round_trip("set")
+        await async_redis_client.set(_plan_key(plan.task), pack_payload(plan.model_dump()), ex=PLAN_TTL_SECONDS)
+        return True
+    except Exception as e:
+        logger.error("Error storing action plan: %s", e)
+        return False
+
+async def get_plan_async(task: str) -> Optional[ActionPlan]:
+    try:
+        count_redis_round_trip("get")
+        payload = await async_redis_client.get(_plan_key(task))
+        return ActionPlan.model_validate(unpack_payload(payload)) if payload is not None else None
+    except Exception as e:
+        logger.error("Error retrieving action plan: %s", e)
+        return None
+
+async def delete_plan_async(task: str) -> bool:
+    try:
+        count_redis_round_trip("delete")
+        await async_redis_client.delete(_plan_key(task))
+        return True
+    except Exception as e:
+        logger.error("Error deleting action plan: %s", e)
+        return False
+
+# ===== Plan Replay =====
+
+_tools: Optional["Tools"] = None
+
+def _get_tools() -> "Tools":
+    global _tools
+    if _tools is None:
+        from browser_use.tools.service import Tools
+        _tools = Tools()
+    return _tools
+
+async def _check_page(browser_session: "BrowserSession", expected_url: Optional[str]) -> None:
+    expected_host = _host(expected_url)
+    if expected_host is None:
+        return
+    current_url = await browser_session.get_current_page_url()
+    if _host(current_url) != expected_host:
+        raise PlanReplayError(f"Expected a page on {expected_host}, found {current_url}")
+
+async def _locate_element(browser_session: "BrowserSession", element: PlanElement) -> int:
+    """Return the current index of a recorded element, matching by XPath and then by attributes"""
+    state = await browser_session.get_browser_state_summary(include_screenshot=False)
+    selector_map = state.dom_state.selector_map or {}
+    node_name = element.node_name.lower()
+    for index, node in selector_map.items():
+        if node.node_name.lower() == node_name and node.xpath == element.x_path:
+            return index
+
+    if element.attributes:
+        candidates = [
+            index for index, node in selector_map.items()
+            if node.node_name.lower() == node_name and all(
+                (node.attributes or {}).get(name) == value for name, value in element.attributes.items()
+            )
+        ]
+        if len(candidates) == 1:
+            return candidates[0]
+    raise PlanReplayError(f"Could not find <{node_name}> at {element.x_path}")
+
+def _extraction_answer(extracted_content: str) -> str:
+    match = re.search(r"<(structured_result|result)>\n(.*)\n</\1>", extracted_content, re.DOTALL)
+    return match.group(2) if match else extracted_content
+
+async def replay_plan(
+    plan: ActionPlan,
+    browser_session: "BrowserSession",
+    page_extraction_llm: Any,
+    on_result: Optional[Callable[[Any], Awaitable[None]]] = None,
+) -> AgentResult:
+    """Re-execute a recorded plan, then answer the task with one extraction from the final page"""
+    from browser_use.filesystem.file_system import FileSystem
+    tools = _get_tools()
+    action_model = tools.registry.create_action_model()
+    steps: List[StepSummary] = []
+    urls: List[str] = []
+
+    for number, step in enumerate(plan.steps, start=1):
+        start = time.time()
+        await _check_page(browser_session, step.url)
+        params = dict(step.params)
+        if step.element is not None:
+            params["index"] = await _locate_element(browser_session, step.element)
+        result = await asyncio.wait_for(
+            tools.act(action_model(**{step.action: params}), browser_session),
+            PLAN_ACTION_TIMEOUT_SECONDS,
+        )
+        if result.error:
+            raise PlanReplayError(f"Step {number} ({step.action}) failed: {result.error}")
+        if on_result is not None:
+            await on_result(result)
+        if _host(step.url) and step.url not in urls:
+            urls.append(step.url)
+        steps.append(StepSummary(
+            step=number,
+            actions=[step.action],
+            url=step.url,
+            description=(result.extracted_content or "")[:300],
+            duration_seconds=round(time.time() - start, 3),
+        ))
+
+    await _check_page(browser_session, plan.final_url)
+    start = time.time()
+    with tempfile.TemporaryDirectory(prefix="agent_plan_") as base_dir:
+        result = await asyncio.wait_for(
+            tools.act(
+                action_model(extract={"params": {"query": plan.task}}),
+                browser_session,
+                page_extraction_llm=page_extraction_llm,
+                file_system=FileSystem(base_dir),
+            ),
+            # Extraction is one LLM call over the page, so it gets a longer budget than browser actions
+            PLAN_ACTION_TIMEOUT_SECONDS * 4,
+        )
+    if result.error or not result.extracted_content:
+        raise PlanReplayError(f"Extraction failed: {result.error or 'no content'}")
+    if on_result is not None:
+        await on_result(result)
+
+    final_url = await browser_session.get_current_page_url()
+    if _host(final_url) and final_url not in urls:
+        urls.append(final_url)
+    steps.append(StepSummary(
+        step=len(steps) + 1,
+        actions=["extract"],
+        url=final_url,
+        description=result.extracted_content[:300],
+        duration_seconds=round(time.time() - start, 3),
+    ))
+    return AgentResult(final_result=_extraction_answer(result.extracted_content), success=True, steps=steps, urls=urls)
+
+async def try_replay_plan(
+    task: str,
+    browser_session: "BrowserSession",
+    page_extraction_llm: Any,
+    on_result: Optional[Callable[[Any], Awaitable[None]]] = None,
+) -> Optional[AgentResult]:
+    """Replay the recorded plan for a task; None when there is none or a step fails validation"""
+    if not PLAN_REPLAY_ENABLED:
+        return None
+    plan = await get_plan_async(task)
+    if plan is None:
+        return None
+
+    start = time.perf_counter()
+    try:
+        result = await replay_plan(plan, browser_session, page_extraction_llm, on_result=on_result)
+    except Exception as e:
+        observe_plan_replay("failed", time.perf_counter() - start)
+        logger.info("Plan replay failed for %r, falling back to the agent: %s", task[:50], e)
+        # A full run re-records the plan if it succeeds
+        await delete_plan_async(task)
+        return None
+    observe_plan_replay("replayed", time.perf_counter() - start)
+    logger.info("Replayed %s recorded steps for %r", len(plan.steps), task[:50])
+    return result
@@ -0,0 +1,146 @@
+import os
+import base64
+import logging
+from typing import Any, Dict, List, Optional
+import orjson
+import zstandard
+from dotenv import load_dotenv
+from pydantic import BaseModel
+from utils import async_redis_client
+from metrics import count_redis_round_trip
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ===== Compact Agent Result Schema =====
+
+RESULT_FORMAT_VERSION = 1
+# Cache payloads start with this tag; anything else is a legacy str(AgentHistoryList)
+PAYLOAD_PREFIX = f"abr{RESULT_FORMAT_VERSION}:"
+AGENT_HISTORY_TTL_SECONDS = int(os.getenv("AGENT_HISTORY_TTL_SECONDS", "86400"))
+
+_compressor = zstandard.ZstdCompressor(level=3)
+_decompressor = zstandard.ZstdDecompressor()
+
+class StepSummary(BaseModel):
+    step: int
+    actions: List[str]
+    url: Optional[str] = None
+    description: str
+    duration_seconds: Optional[float] = None
+
+class AgentResult(BaseModel):
+    version: int = RESULT_FORMAT_VERSION
+    final_result: Optional[str] = None
+    success: Optional[bool] = None
+    steps: List[StepSummary] = []
+    urls: List[str] = []
+    # Key of the full history, expanded only on request via get_full_history_async
+    history_id: Optional[str] = None
+
+def pack_payload(data: Any) -> str:
+    """orjson + zstd, base64-encoded so it fits string-only stores"""
+    raw = orjson.dumps(data, default=str)
+    return base64.b64encode(_compressor.compress(raw)).decode("ascii")
+
+def unpack_payload(payload: str) -> Any:
+    return orjson.loads(_decompressor.decompress(base64.b64decode(payload)))
+
+def _action_names(model_output: Any) -> List[str]:
+    names = []
+    for action in getattr(model_output, "action", None) or []:
+        try:
+            dumped = action.model_dump(exclude_unset=True)
+            names.extend(name for name, params in dumped.items() if params is not None)
+        except Exception:
+            names.append(type(action).__name__)
+    return names
+
+def _describe(results: List[Any], max_length: int = 300) -> str:
+    for result in reversed(results or []):
+        if getattr(result, "error", None):
+            return f"Error: {result.error}"[:max_length]
+        if getattr(result, "extracted_content", None):
+            return result.extracted_content[:max_length]
+    return ""
+
+def summarize_history(history: Any, history_id: Optional[str] = None) -> AgentResult:
+    """Reduce an AgentHistoryList to the final answer, a step summary and the URLs visited"""
+    steps: List[StepSummary] = []
+    urls: List[str] = []
+    for index, item in enumerate(getattr(history, "history", None) or [], start=1):
+        metadata = getattr(item, "metadata", None)
+        state = getattr(item, "state", None)
+        url = getattr(state, "url", None)
+        if url and url != "about:blank" and url not in urls:
+            urls.append(url)
+        duration = None
+        if metadata is not None and metadata.step_end_time and metadata.step_start_time:
+            duration = round(metadata.step_end_time - metadata.step_start_time, 3)
+        steps.append(StepSummary(
+            step=getattr(metadata, "step_number", None) or index,
+            actions=_action_names(getattr(item, "model_output", None)),
+            url=url,
+            description=_describe(getattr(item, "result", None)),
+            duration_seconds=duration,
+        ))
+
+    return AgentResult(
+        final_result=history.final_result() if hasattr(history, "final_result") else str(history),
+        success=history.is_successful() if hasattr(history, "is_successful") else None,
+        steps=steps,
+        urls=urls,
+        history_id=history_id,
+    )
+
+def encode_result(result: AgentResult) -> str:
+    """Serialize an agent result into a compact, version-tagged cache payload"""
+    return PAYLOAD_PREFIX + pack_payload(result.model_dump(exclude_none=True))
+
+def decode_result(payload: str) -> Optional[AgentResult]:
+    """Parse a cache payload; returns None for legacy or unreadable entries"""
+    if not payload.startswith(PAYLOAD_PREFIX):
+        return None
+    try:
+        return AgentResult.model_validate(unpack_payload(payload[len(PAYLOAD_PREFIX):]))
+    except Exception as e:
+        logger.error("Error decoding cached result: %s", e)
+        return None
+
+def result_to_response(payload: str) -> Dict[str, Any]:
+    """Build the API response body for a cache payload or a legacy result string"""
+    result = decode_result(payload)
+    if result is None:
+        return {"message": payload}
+    return {
+        "message": result.final_result or "Agent execution completed.",
+        "steps": [step.model_dump(exclude_none=True) for step in result.steps],
+        "urls": result.urls,
+        "history_id": result.history_id,
+    }
+
+# ===== Full History Storage =====
+
+async def store_full_history_async(history_id: str, history: Any) -> bool:
+    """Store the complete agent history, compressed, for lazy expansion"""
+    try:
+        data = history.model_dump() if hasattr(history, "model_dump") else {"history": str(history)}
+        count_redis_round_trip("set")
+        await async_redis_client.set(
+            f"agent_history:{history_id}", pack_payload(data), ex=AGENT_HISTORY_TTL_SECONDS
+        )
+        return True
+    except Exception as e:
+        logger.error("Error storing agent history: %s", e)
+        return False
+
+async def get_full_history_async(history_id: str) -> Optional[Dict[str, Any]]:
+    """Retrieve and expand a stored agent history"""
+    try:
+        count_redis_round_trip("get")
+        payload = await async_redis_client.get(f"agent_history:{history_id}")
+        return unpack_payload(payload) if payload is not None else None
+    except Exception as e:
+        logger.error("Error retrieving agent history: %s", e)
+        return None
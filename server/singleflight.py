@@ -0,0 +1,192 @@
+import os
+import logging
+import json
+import uuid
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from utils import normalize_prompt, async_redis_client
+from metrics import count_redis_round_trip
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ===== Single-Flight Deduplication =====
+
+Listener = Callable[[Any], Awaitable[None]]
+
+class _Flight:
+    """An in-flight run, the number of callers waiting on it and their progress listeners"""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        self.listeners: List[Listener] = []
+
+    async def emit(self, event: Any) -> None:
+        """Forward a progress event from the run to every caller currently waiting on it"""
+        for listener in list(self.listeners):
+            try:
+                await listener(event)
+            except Exception as e:
+                logger.error("Error forwarding single-flight progress: %s", e)
+
+class SingleFlight:
+    """Collapse concurrent runs of the same normalized task into one, optionally across workers via Redis"""
+
+    def __init__(self, distributed: bool = False, lock_ttl_seconds: float = 300.0):
+        self.distributed = distributed
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self._inflight: Dict[str, _Flight] = {}
+
+    async def do(
+        self,
+        task: str,
+        fn: Callable[[Optional[Listener]], Awaitable[str]],
+        scope: Optional[str] = None,
+        joinable: bool = True,
+        on_progress: Optional[Listener] = None,
+    ) -> Tuple[str, bool]:
+        """Run fn once per in-flight task (and scope, e.g. a user); returns (result, shared)
+
+        fn is given a callback for progress events; each caller's on_progress receives the events
+        emitted while it waits, whether it started the run or joined it.
+        A run that is not joinable still joins an existing flight, but otherwise runs fn privately:
+        use it when fn borrows a resource its caller owns (e.g. a tab of the caller's browser),
+        since other callers could keep the run going after the caller releases it.
+        """
+        key = f"task:{normalize_prompt(task)}" if scope is None else f"scope:{scope}:{normalize_prompt(task)}"
+
+        flight = self._inflight.get(key)
+        joined = flight is not None
+        if joined:
+            logger.debug("Joining in-flight run for task: %s...", task[:50])
+        elif not joinable:
+            return await fn(on_progress), False
+        else:
+            # The run is owned here rather than by the first caller, so cancelling one caller
+            # (a cancelled job, a disconnected client) does not cancel it for everyone else
+            flight = _Flight()
+            flight.task = asyncio.create_task(self._run(key, lambda: fn(flight.emit)))
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self._inflight[key] = flight
+
+        flight.waiters += 1
+        if on_progress is not None:
+            flight.listeners.append(on_progress)
+        try:
+            result, shared = await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if on_progress is not None:
+                flight.listeners.remove(on_progress)
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody wants the result any more
+                self._forget(key, flight)
+                flight.task.cancel()
+                await asyncio.gather(flight.task, return_exceptions=True)
+        return result, shared or joined
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[str]]) -> Tuple[str, bool]:
+        if self.distributed:
+            return await self._do_distributed(key, fn)
+        return await fn(), False
+
+    async def _do_distributed(self, key: str, fn: Callable[[], Awaitable[str]]) -> Tuple[str, bool]:
+        lock_key = f"singleflight:lock:{key}"
+        result_key = f"singleflight:result:{key}"
+        channel = f"singleflight:channel:{key}"
+        token = uuid.uuid4().hex
+
+        try:
+            count_redis_round_trip("set")
+            acquired = await async_redis_client.set(
+                lock_key, token, nx=True, px=int(self.lock_ttl_seconds * 1000)
+            )
+        except Exception as e:
+            logger.error("Error acquiring single-flight lock, running locally: %s", e)
+            return await fn(), False
+
+        if not acquired:
+            shared_result = await self._wait_for_leader(result_key, channel)
+            if shared_result is not None:
+                return shared_result, True
+            logger.warning("Single-flight leader did not finish in time, running locally: %s...", key[:50])
+            return await fn(), False
+
+        try:
+            result = await fn()
+            payload = json.dumps({"result": result})
+        except Exception as e:
+            payload = json.dumps({"error": str(e)})
+            await self._publish(result_key, channel, payload)
+            raise
+        else:
+            await self._publish(result_key, channel, payload)
+            return result, False
+        finally:
+            await self._release(lock_key, token)
+
+    async def _wait_for_leader(self, result_key: str, channel: str) -> Optional[str]:
+        pubsub = async_redis_client.pubsub()
+        try:
+            count_redis_round_trip("subscribe")
+            await pubsub.subscribe(channel)
+            # The leader may have finished between our lock attempt and subscribing
+            count_redis_round_trip("get")
+            payload = await async_redis_client.get(result_key)
+            if payload is None:
+                payload = await asyncio.wait_for(self._next_message(pubsub), self.lock_ttl_seconds)
+        except asyncio.TimeoutError:
+            return None
+        except Exception as e:
+            logger.error("Error waiting for single-flight leader: %s", e)
+            return None
+        finally:
+            await pubsub.aclose()
+        return self._decode(payload)
+
+    @staticmethod
+    async def _next_message(pubsub) -> str:
+        async for message in pubsub.listen():
+            if message.get("type") == "message":
+                return message["data"]
+
+    @staticmethod
+    def _decode(payload: str) -> str:
+        data = json.loads(payload)
+        if "error" in data:
+            raise RuntimeError(data["error"])
+        return data["result"]
+
+    async def _publish(self, result_key: str, channel: str, payload: str) -> None:
+        try:
+            # Keep the result briefly for followers that subscribe late
+            count_redis_round_trip("set")
+            await async_redis_client.set(result_key, payload, ex=30)
+            count_redis_round_trip("publish")
+            await async_redis_client.publish(channel, payload)
+        except Exception as e:
+            logger.error("Error publishing single-flight result: %s", e)
+
+    @staticmethod
+    async def _release(lock_key: str, token: str) -> None:
+        try:
+            # Only delete the lock if we still own it
+            count_redis_round_trip("eval")
+            await async_redis_client.eval(
+                "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end",
+                1, lock_key, token,
+            )
+        except Exception as e:
+            logger.error("Error releasing single-flight lock: %s", e)
+
+agent_singleflight = SingleFlight(
+    distributed=os.getenv("SINGLEFLIGHT_DISTRIBUTED", "false").lower() == "true",
+    lock_ttl_seconds=float(os.getenv("SINGLEFLIGHT_LOCK_TTL_SECONDS", "300")),
+)
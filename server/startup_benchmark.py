@@ -0,0 +1,157 @@
+"""
+Startup Benchmark: how quickly a fresh server process can serve a cache hit
+
+Starts a new interpreter per run, imports the app with the offline benchmark's stand-ins,
+runs the lifespan (which still imports the real LangCache SDK and builds its client) and measures the time to the first /health response and the first
+cached /agent/chat answer. Also reports what importing browser_use up front would cost.
+
+    uv run --group dev python startup_benchmark.py --runs 5
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from typing import Any, Dict, List, Optional
+
+CHILD_ENV = {
+    "LOG_LEVEL": "WARNING",
+    "BROWSER_USE_SETUP_LOGGING": "false",
+    "CACHE_BACKEND": "langcache",
+    "BROWSER_POOL_PREWARM": "false",
+}
+
+HOT_PROMPT = "Find the number 1 post on Show HN"
+
+
+# ===== Child Process =====
+
+def defer_langcache_stand_in(utils, fake) -> None:
+    """Let the server import the LangCache SDK and build its client as usual, then answer lookups from the fake"""
+    build_client = utils.get_langcache_client
+    utils.langcache_client = None
+
+    def get_langcache_client():
+        if utils.langcache_client is not fake:
+            build_client()
+            utils.langcache_client = fake
+        return fake
+
+    utils.get_langcache_client = get_langcache_client
+
+def measure_startup() -> Dict[str, Any]:
+    """Import the server, start it and serve one cache hit, timing each phase"""
+    import time
+    start = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+
+    import asyncio
+    import httpx
+    import offline_benchmark
+
+    args = offline_benchmark.parse_args(["--langcache-latency", "0"])
+    stand_ins = offline_benchmark.install_stand_ins(args, fake_agent=False)
+    defer_langcache_stand_in(stand_ins["utils"], stand_ins["langcache"])
+    freshness = stand_ins["freshness"]
+    stand_ins["langcache"].entries[HOT_PROMPT] = freshness.wrap_entry(
+        f"Cached result for: {HOT_PROMPT}", freshness.classify_task(HOT_PROMPT)
+    )
+
+    async def serve() -> Dict[str, float]:
+        timings: Dict[str, float] = {}
+        app = main.app
+        async with app.router.lifespan_context(app):
+            timings["ready_s"] = time.perf_counter() - start
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+                response = await client.get("/health")
+                response.raise_for_status()
+                timings["first_health_s"] = time.perf_counter() - start
+                response = await client.post("/agent/chat", json={"message": HOT_PROMPT})
+                response.raise_for_status()
+                if not response.json()["message"].startswith("Cached result"):
+                    raise RuntimeError("Expected a cache hit")
+                timings["first_cache_hit_s"] = time.perf_counter() - start
+        return timings
+
+    timings = asyncio.run(serve())
+    return {
+        "import_s": imported - start,
+        "app_import_s": main.IMPORT_SECONDS,
+        **timings,
+        "browser_use_loaded": "browser_use" in sys.modules,
+        "langcache_loaded": "langcache" in sys.modules,
+    }
+
+def measure_browser_use_import() -> Dict[str, Any]:
+    """Time the import the server now defers to the first agent run"""
+    import time
+    start = time.perf_counter()
+    from browser_use import Agent, BrowserProfile, BrowserSession, ChatGoogle  # noqa: F401
+    from browser_use.tools.service import Tools  # noqa: F401
+    return {"browser_use_import_s": time.perf_counter() - start}
+
+
+# ===== Parent Process =====
+
+def run_child(mode: str) -> Dict[str, Any]:
+    env = {**os.environ, **CHILD_ENV}
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", mode],
+        env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {}
+    for key, value in runs[0].items():
+        if isinstance(value, bool):
+            summary[key] = all(run[key] == value for run in runs) and value
+            continue
+        values = [run[key] * 1000 for run in runs]
+        summary[key[:-2] + "_ms"] = {
+            "median": statistics.median(values),
+            "min": min(values),
+            "max": max(values),
+        }
+    return summary
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Startup time benchmark for the agent server")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to start")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--child", choices=["startup", "browser_use"], help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if args.child == "startup":
+        print(json.dumps(measure_startup()))
+        return
+    if args.child == "browser_use":
+        print(json.dumps(measure_browser_use_import()))
+        return
+
+    report = {
+        "runs": args.runs,
+        "python": sys.version.split()[0],
+        "startup": summarize([run_child("startup") for _ in range(args.runs)]),
+        "deferred": summarize([run_child("browser_use") for _ in range(args.runs)]),
+    }
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from browser_pool import BrowserPool
+
+
+def _fake_session():
+    session = MagicMock()
+    for method in ("start", "kill", "stop", "clear_cookies", "navigate_to", "close_page", "get_or_create_cdp_session"):
+        setattr(session, method, AsyncMock())
+    session.agent_focus = SimpleNamespace(target_id="blank")
+    session.get_current_page_url = AsyncMock(return_value="about:blank")
+    session.get_tabs = AsyncMock(return_value=[SimpleNamespace(target_id="old-tab")])
+    session.cdp_client = MagicMock(send=AsyncMock())
+    session.get_or_create_cdp_session.return_value = SimpleNamespace(cdp_client=session.cdp_client, session_id="s1")
+    return session
+
+
+def _pool(size: int = 1) -> BrowserPool:
+    pool = BrowserPool(size=size)
+    pool.sessions = []
+
+    def new_session():
+        pool.sessions.append(_fake_session())
+        return pool.sessions[-1]
+
+    pool._new_session = new_session
+    return pool
+
+
+def test_discarded_browser_frees_its_slot_for_a_waiting_lease():
+    async def run():
+        pool = _pool(size=1)
+        first_leased = asyncio.Event()
+        release_first = asyncio.Event()
+
+        async def first():
+            async with pool.lease() as session:
+                # Cleanup fails, so this browser is discarded instead of returned
+                session.clear_cookies.side_effect = RuntimeError("browser crashed")
+                first_leased.set()
+                await release_first.wait()
+
+        async def second():
+            async with pool.lease() as session:
+                return session
+
+        first_task = asyncio.create_task(first())
+        await first_leased.wait()
+        second_task = asyncio.create_task(second())
+        await asyncio.sleep(0)
+        assert not second_task.done()
+
+        release_first.set()
+        await first_task
+        session = await asyncio.wait_for(second_task, timeout=1)
+
+        assert session is pool.sessions[1]
+        pool.sessions[0].kill.assert_awaited()
+        assert pool.stats()["created"] == 1
+        assert pool.stats()["idle"] == 1
+
+    asyncio.run(run())
+
+
+def test_failed_launch_frees_its_slot():
+    async def run():
+        pool = _pool(size=1)
+        failing = _fake_session()
+        failing.start.side_effect = RuntimeError("no chromium")
+        pool._new_session = lambda: failing
+        try:
+            async with pool.lease():
+                pass
+        except RuntimeError:
+            pass
+        failing.kill.assert_awaited()
+        assert pool.stats()["created"] == 0
+
+    asyncio.run(run())
+
+
+def test_clean_clears_site_storage_for_every_visited_origin():
+    async def run():
+        pool = _pool(size=1)
+        async with pool.lease() as session:
+            on_target_info = session.cdp_client.register.Target.targetInfoChanged.call_args.args[0]
+            on_target_info({"targetInfo": {"url": "https://news.ycombinator.com/show"}})
+            on_target_info({"targetInfo": {"url": "https://example.com/a?b=c"}})
+            on_target_info({"targetInfo": {"url": "about:blank"}})
+
+        session.close_page.assert_awaited_with("old-tab")
+        session.clear_cookies.assert_awaited()
+        session.cdp_client.send.Network.clearBrowserCache.assert_awaited()
+        cleared = {call.kwargs["params"]["origin"] for call in session.cdp_client.send.Storage.clearDataForOrigin.await_args_list}
+        assert cleared == {"https://news.ycombinator.com", "https://example.com"}
+        assert not pool._idle[0].origins
+
+    asyncio.run(run())
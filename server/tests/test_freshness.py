@@ -0,0 +1,41 @@
+from freshness import (
+    DEFAULT_FRESHNESS_CLASS,
+    FreshnessClass,
+    _resolve,
+    classify_task,
+    entry_state,
+    unwrap_entry,
+    wrap_entry,
+)
+
+
+def test_tasks_are_classified_by_how_fast_their_answers_change():
+    assert classify_task("Find the number 1 post on Show HN").name == "live"
+    assert classify_task("What is the current price of bitcoin").name == "live"
+    assert classify_task("What is a monad").name == "static"
+    assert classify_task("Summarize the README of the requests library") is DEFAULT_FRESHNESS_CLASS
+
+
+def test_entry_is_fresh_then_stale_then_expired():
+    created_at = 1000.0
+    assert entry_state(created_at, 300, 900, now=created_at + 300) == "fresh"
+    assert entry_state(created_at, 300, 900, now=created_at + 301) == "stale"
+    assert entry_state(created_at, 300, 900, now=created_at + 1200) == "stale"
+    assert entry_state(created_at, 300, 900, now=created_at + 1201) == "expired"
+
+
+def test_wrapped_entry_round_trips_payloads_containing_colons():
+    freshness_class = FreshnessClass("live", 300, 900)
+    entry = wrap_entry("r1:{\"a\": 1}", freshness_class, created_at=1000.0)
+
+    assert unwrap_entry(entry) == ("r1:{\"a\": 1}", 1000.0, 300.0, 900.0)
+
+
+def test_legacy_entries_are_served_as_stale_and_expired_ones_are_dropped():
+    assert _resolve("plain answer") == ("plain answer", "stale")
+    assert _resolve(None) == (None, "miss")
+
+    expired = wrap_entry("answer", FreshnessClass("live", 300, 900), created_at=0.0)
+    assert _resolve(expired) == (None, "expired")
+    fresh = wrap_entry("answer", FreshnessClass("live", 300, 900))
+    assert _resolve(fresh) == ("answer", "fresh")
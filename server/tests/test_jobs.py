@@ -0,0 +1,95 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+import jobs
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    read = client.xreadgroup
+
+    async def xreadgroup(*args, block=None, **kwargs):
+        # fakeredis returns at once instead of blocking, which would spin the worker loops
+        entries = await read(*args, **kwargs)
+        if not entries and block:
+            await asyncio.sleep(block / 1000)
+        return entries
+
+    client.xreadgroup = xreadgroup
+    monkeypatch.setattr(jobs, "async_redis_client", client)
+
+    async def miss(message):
+        return None, "miss"
+
+    async def done(*args, **kwargs):
+        return True
+
+    monkeypatch.setattr(jobs, "lookup_cached_response_async", miss)
+    monkeypatch.setattr(jobs, "cache_fresh_response_async", done)
+    monkeypatch.setattr(jobs, "store_conversation_history_async", done)
+    return client
+
+
+def _manager(consumer: str) -> jobs.JobManager:
+    backend = jobs.RedisStreamJobBackend(max_size=10, max_per_user=5, result_ttl_seconds=60, claim_idle_seconds=0.2)
+    backend.consumer = consumer
+    return jobs.JobManager(backend, concurrency=1, cancel_poll_seconds=0.05)
+
+
+async def _wait_for_status(manager: jobs.JobManager, job_id: str, status: str) -> dict:
+    for _ in range(100):
+        job = await manager.get(job_id)
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"job {job_id} is {job['status']}, not {status}")
+
+
+def test_job_running_at_shutdown_is_reclaimed_by_another_worker(redis):
+    async def run():
+        runs = []
+
+        async def runner(message, user_id=None):
+            runs.append(message)
+            await asyncio.sleep(0.2)
+            return "answer", True
+
+        first = _manager("first")
+        await first.start(runner)
+        job = await first.submit("Find the top post", "user")
+        await _wait_for_status(first, job["id"], "running")
+        await first.stop()
+
+        assert (await first.get(job["id"]))["status"] == "queued"
+        assert (await redis.xpending(first.backend.stream_key, first.backend.group))["pending"] == 1
+
+        second = _manager("second")
+        await second.start(runner)
+        try:
+            finished = await _wait_for_status(second, job["id"], "done")
+        finally:
+            await second.stop()
+
+        # Handing the job back on shutdown does not use up an attempt
+        assert finished.get("attempts", 1) == 1
+        assert runs == ["Find the top post", "Find the top post"]
+        assert (await redis.xpending(first.backend.stream_key, first.backend.group))["pending"] == 0
+
+    asyncio.run(run())
+
+
+def test_cancel_does_not_overwrite_a_finished_job(redis):
+    async def run():
+        manager = _manager("worker")
+        job = await manager.submit("Find the top post", "user")
+        await manager.backend.update(job["id"], lambda current: current.update(status="done") or True)
+
+        cancelled = await manager.cancel(job["id"])
+
+        assert cancelled["status"] == "done"
+        assert not cancelled.get("cancel_requested")
+
+    asyncio.run(run())
@@ -0,0 +1,70 @@
+import importlib.util
+
+import pytest
+
+import utils
+from utils import HashingEmbedder, LocalSemanticCacheBackend
+
+CACHED_PROMPT = "Find the cheapest flight from London to New York on March 3 and list the airline, departure time and price"
+
+NEAR_MISSES = [
+    "Find the number 2 post on Show HN",
+    "Find the number 10 post on Show HN",
+    "Find the cheapest flight from London to New York on March 4 and list the airline, departure time and price",
+]
+
+
+def _hashing_backend(monkeypatch, **env) -> LocalSemanticCacheBackend:
+    monkeypatch.setenv("CACHE_BACKEND", "local")
+    monkeypatch.setenv("SEMANTIC_CACHE_MODEL", "hashing")
+    monkeypatch.delenv("SEMANTIC_CACHE_THRESHOLD", raising=False)
+    monkeypatch.delenv("SEMANTIC_CACHE_PATH", raising=False)
+    for key, value in env.items():
+        monkeypatch.setenv(key, value)
+    return utils._create_cache_backend()
+
+
+def test_hashing_backend_does_not_match_near_miss_prompts(monkeypatch):
+    backend = _hashing_backend(monkeypatch)
+    backend.set("Find the number 1 post on Show HN", "first")
+    backend.set(CACHED_PROMPT, "march 3")
+
+    for prompt in NEAR_MISSES:
+        assert backend.search(prompt) is None, prompt
+    assert backend.search_many(NEAR_MISSES) == [None] * len(NEAR_MISSES)
+
+
+def test_hashing_backend_matches_the_same_prompt_rephrased_in_case_and_spacing(monkeypatch):
+    backend = _hashing_backend(monkeypatch)
+    backend.set("Find the number 1 post on Show HN", "first")
+
+    assert backend.search("find the number 1 post  on show HN") == "first"
+
+
+@pytest.mark.skipif(importlib.util.find_spec("fastembed") is not None, reason="fastembed is installed")
+def test_missing_embedding_model_fails_instead_of_falling_back(monkeypatch):
+    monkeypatch.setenv("CACHE_BACKEND", "local")
+    monkeypatch.delenv("SEMANTIC_CACHE_MODEL", raising=False)
+
+    with pytest.raises(ImportError, match="SEMANTIC_CACHE_MODEL=hashing"):
+        utils._create_cache_backend()
+
+
+def test_snapshot_is_written_on_close_rather_than_every_set(tmp_path):
+    path = str(tmp_path / "cache.npz")
+    backend = LocalSemanticCacheBackend(HashingEmbedder(), threshold=0.99, path=path, save_interval_seconds=3600)
+    backend.set("Find the number 1 post on Show HN", "first")
+    backend.set("Find the number 2 post on Show HN", "second")
+    assert not (tmp_path / "cache.npz").exists()
+
+    backend.close()
+    reloaded = LocalSemanticCacheBackend(HashingEmbedder(), threshold=0.99, path=path)
+    assert reloaded.search("Find the number 2 post on Show HN") == "second"
+
+
+def test_snapshot_is_rewritten_once_the_interval_has_passed(tmp_path):
+    path = tmp_path / "cache.npz"
+    backend = LocalSemanticCacheBackend(HashingEmbedder(), threshold=0.99, path=str(path), save_interval_seconds=0)
+    backend.set("Find the number 1 post on Show HN", "first")
+
+    assert path.exists()
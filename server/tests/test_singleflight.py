@@ -0,0 +1,83 @@
+import asyncio
+
+from singleflight import SingleFlight
+
+
+def test_joined_callers_receive_progress_from_the_shared_run():
+    async def run():
+        flight = SingleFlight()
+        joined = asyncio.Event()
+        first_steps, second_steps = [], []
+
+        async def fn(emit):
+            await emit("step 1")
+            await joined.wait()
+            await emit("step 2")
+            return "result"
+
+        async def collect(steps, step):
+            steps.append(step)
+
+        first = asyncio.create_task(flight.do("Find the top post", fn, on_progress=lambda step: collect(first_steps, step)))
+        while not first_steps:
+            await asyncio.sleep(0)
+        second = asyncio.create_task(flight.do("find the top post", fn, on_progress=lambda step: collect(second_steps, step)))
+        await asyncio.sleep(0)
+        joined.set()
+
+        assert await first == ("result", False)
+        assert await second == ("result", True)
+        assert first_steps == ["step 1", "step 2"]
+        assert second_steps == ["step 2"]
+
+    asyncio.run(run())
+
+
+def test_cancelling_one_caller_leaves_the_run_to_the_others():
+    async def run():
+        flight = SingleFlight()
+        release = asyncio.Event()
+        runs = []
+
+        async def fn(emit):
+            runs.append(1)
+            await release.wait()
+            return "result"
+
+        first = asyncio.create_task(flight.do("Find the top post", fn))
+        second = asyncio.create_task(flight.do("Find the top post", fn))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        release.set()
+
+        assert await second == ("result", True)
+        assert first.cancelled()
+        assert len(runs) == 1
+
+    asyncio.run(run())
+
+
+def test_run_is_cancelled_once_every_caller_has_left():
+    async def run():
+        flight = SingleFlight()
+        started, cancelled = asyncio.Event(), asyncio.Event()
+
+        async def fn(emit):
+            started.set()
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        callers = [asyncio.create_task(flight.do("Find the top post", fn)) for _ in range(2)]
+        await started.wait()
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+
+        assert cancelled.is_set()
+        assert not flight._inflight
+
+    asyncio.run(run())
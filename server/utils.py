@@ -1,18 +1,133 @@
 import os
+import logging
 import json
+import time
+import threading
+import zlib
+import asyncio
+import importlib.util
+from abc import ABC, abstractmethod
 import redis
-from typing import Dict, List, Optional
+import redis.asyncio as aioredis
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 from datetime import datetime
 from dotenv import load_dotenv
-from langcache import LangCache
+from metrics import count_redis_round_trip, observe_cache_lookup
+
+if TYPE_CHECKING:
+    # NumPy is only needed once a semantic lookup runs, so it is imported there
+    import numpy as np
 
 load_dotenv()
 
-# Initialize LangCache for semantic caching
-langcache_client = LangCache(
-    server_url=os.getenv("LANGCACHE_SERVER_URL", "https://aws-us-east-1.langcache.redis.io"),
-    cache_id=os.getenv("LANGCACHE_CACHE_ID", ""),
-    api_key=os.getenv("LANGCACHE_API_KEY", "")
+logger = logging.getLogger(__name__)
+
+# LangCache client for semantic caching, created on first use since its SDK is slow to import
+langcache_client = None
+
+def get_langcache_client():
+    global langcache_client
+    if langcache_client is None:
+        from langcache import LangCache
+        langcache_client = LangCache(
+            server_url=os.getenv("LANGCACHE_SERVER_URL", "https://aws-us-east-1.langcache.redis.io"),
+            cache_id=os.getenv("LANGCACHE_CACHE_ID", ""),
+            api_key=os.getenv("LANGCACHE_API_KEY", "")
+        )
+    return langcache_client
+
+# Redis clients backed by connection pools shared by all sync and async helpers; connections open on first use
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+
+redis_pool = redis.ConnectionPool.from_url(
+    REDIS_URL,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    socket_timeout=REDIS_SOCKET_TIMEOUT,
+    decode_responses=True,
+)
+redis_client = redis.Redis(connection_pool=redis_pool)
+
+async_redis_pool = aioredis.ConnectionPool.from_url(
+    REDIS_URL,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    socket_timeout=REDIS_SOCKET_TIMEOUT,
+    decode_responses=True,
+)
+async_redis_client = aioredis.Redis(connection_pool=async_redis_pool)
+
+# Keep only the last N conversations per user to avoid unbounded growth
+CONVERSATION_HISTORY_MAX_LENGTH = 100
+
+# ===== Local Response Cache (tier 1) =====
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a prompt for exact-match lookups (case and whitespace insensitive)"""
+    return " ".join(prompt.lower().split())
+
+class LocalResponseCache:
+    """In-process exact-match LRU cache with size and TTL limits, checked before LangCache"""
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 300.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, prompt: str) -> Optional[str]:
+        key = normalize_prompt(prompt)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            response, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return response
+
+    def set(self, prompt: str, response: str) -> None:
+        if self.max_size <= 0:
+            return
+        key = normalize_prompt(prompt)
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds > 0 else None
+        with self._lock:
+            self._entries[key] = (response, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+local_response_cache = LocalResponseCache(
+    max_size=int(os.getenv("LOCAL_CACHE_MAX_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("LOCAL_CACHE_TTL_SECONDS", "300")),
 )
 
 # ===== Long-Term Memory Functions =====
@@ -21,53 +136,167 @@ def store_long_term_memory(user_id: str, key: str, value: str) -> bool:
     """Store a long-term memory item for a user"""
     try:
         redis_key = f"longterm_memory:{user_id}"
+        count_redis_round_trip("hset")
         redis_client.hset(redis_key, key, value)
-        print(f"Stored memory: {key} = {value} for user {user_id}")
+        logger.debug("Stored memory: %s = %s for user %s", key, value, user_id)
         return True
     except Exception as e:
-        print(f"Error storing long-term memory: {e}")
+        logger.error("Error storing long-term memory: %s", e)
+        return False
+
+async def store_long_term_memory_async(user_id: str, key: str, value: str) -> bool:
+    """Store a long-term memory item for a user without blocking the event loop"""
+    try:
+        redis_key = f"longterm_memory:{user_id}"
+        count_redis_round_trip("hset")
+        await async_redis_client.hset(redis_key, key, value)
+        logger.debug("Stored memory: %s = %s for user %s", key, value, user_id)
+        return True
+    except Exception as e:
+        logger.error("Error storing long-term memory: %s", e)
         return False
 
 def get_long_term_memory(user_id: str, key: str) -> Optional[str]:
     """Retrieve a specific long-term memory item for a user"""
     try:
         redis_key = f"longterm_memory:{user_id}"
+        count_redis_round_trip("hget")
         value = redis_client.hget(redis_key, key)
-        print(f"Retrieved memory: {key} = {value} for user {user_id}")
+        logger.debug("Retrieved memory: %s = %s for user %s", key, value, user_id)
+        return value
+    except Exception as e:
+        logger.error("Error retrieving long-term memory: %s", e)
+        return None
+
+async def get_long_term_memory_async(user_id: str, key: str) -> Optional[str]:
+    """Retrieve a specific long-term memory item for a user without blocking the event loop"""
+    try:
+        redis_key = f"longterm_memory:{user_id}"
+        count_redis_round_trip("hget")
+        value = await async_redis_client.hget(redis_key, key)
+        logger.debug("Retrieved memory: %s = %s for user %s", key, value, user_id)
         return value
     except Exception as e:
-        print(f"Error retrieving long-term memory: {e}")
+        logger.error("Error retrieving long-term memory: %s", e)
         return None
 
+def store_long_term_memories(user_id: str, memories: Dict[str, str]) -> bool:
+    """Store many long-term memory items for a user in one round trip"""
+    if not memories:
+        return True
+    try:
+        redis_key = f"longterm_memory:{user_id}"
+        count_redis_round_trip("hset")
+        redis_client.hset(redis_key, mapping=memories)
+        logger.debug("Stored %s memories for user %s", len(memories), user_id)
+        return True
+    except Exception as e:
+        logger.error("Error storing long-term memories: %s", e)
+        return False
+
+async def store_long_term_memories_async(user_id: str, memories: Dict[str, str]) -> bool:
+    """Store many long-term memory items for a user in one round trip, without blocking the event loop"""
+    if not memories:
+        return True
+    try:
+        redis_key = f"longterm_memory:{user_id}"
+        count_redis_round_trip("hset")
+        await async_redis_client.hset(redis_key, mapping=memories)
+        logger.debug("Stored %s memories for user %s", len(memories), user_id)
+        return True
+    except Exception as e:
+        logger.error("Error storing long-term memories: %s", e)
+        return False
+
+def get_long_term_memories(user_id: str, keys: List[str]) -> Dict[str, Optional[str]]:
+    """Retrieve many long-term memory items for a user in one round trip"""
+    if not keys:
+        return {}
+    try:
+        redis_key = f"longterm_memory:{user_id}"
+        count_redis_round_trip("hmget")
+        values = redis_client.hmget(redis_key, keys)
+        return dict(zip(keys, values))
+    except Exception as e:
+        logger.error("Error retrieving long-term memories: %s", e)
+        return {}
+
+async def get_long_term_memories_async(user_id: str, keys: List[str]) -> Dict[str, Optional[str]]:
+    """Retrieve many long-term memory items for a user in one round trip, without blocking the event loop"""
+    if not keys:
+        return {}
+    try:
+        redis_key = f"longterm_memory:{user_id}"
+        count_redis_round_trip("hmget")
+        values = await async_redis_client.hmget(redis_key, keys)
+        return dict(zip(keys, values))
+    except Exception as e:
+        logger.error("Error retrieving long-term memories: %s", e)
+        return {}
+
 def get_all_long_term_memories(user_id: str) -> Dict[str, str]:
     """Retrieve all long-term memories for a user"""
     try:
         redis_key = f"longterm_memory:{user_id}"
+        count_redis_round_trip("hgetall")
         memories = redis_client.hgetall(redis_key)
-        print(f"Retrieved all memories for user {user_id}: {memories}")
+        logger.debug("Retrieved all memories for user %s: %s", user_id, memories)
+        return memories
+    except Exception as e:
+        logger.error("Error retrieving all long-term memories: %s", e)
+        return {}
+
+async def get_all_long_term_memories_async(user_id: str) -> Dict[str, str]:
+    """Retrieve all long-term memories for a user without blocking the event loop"""
+    try:
+        redis_key = f"longterm_memory:{user_id}"
+        count_redis_round_trip("hgetall")
+        memories = await async_redis_client.hgetall(redis_key)
+        logger.debug("Retrieved all memories for user %s: %s", user_id, memories)
         return memories
     except Exception as e:
-        print(f"Error retrieving all long-term memories: {e}")
+        logger.error("Error retrieving all long-term memories: %s", e)
         return {}
 
+def _history_entry(task: str, result: str) -> str:
+    return json.dumps({
+        "timestamp": datetime.now().isoformat(),
+        "task": task,
+        "result": result
+    })
+
 def store_conversation_history(user_id: str, task: str, result: str) -> bool:
     """Store conversation/task history in Redis"""
     try:
         redis_key = f"conversation_history:{user_id}"
-        timestamp = datetime.now().isoformat()
-        history_entry = json.dumps({
-            "timestamp": timestamp,
-            "task": task,
-            "result": result
-        })
-        # Use a list to store conversation history
-        redis_client.rpush(redis_key, history_entry)
-        # Keep only last 100 conversations to avoid unbounded growth
-        redis_client.ltrim(redis_key, -100, -1)
-        print(f"Stored conversation history for user {user_id}")
+        history_entry = _history_entry(task, result)
+        # Push and trim in a single MULTI round trip
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.rpush(redis_key, history_entry)
+        pipe.ltrim(redis_key, -CONVERSATION_HISTORY_MAX_LENGTH, -1)
+        count_redis_round_trip("pipeline")
+        pipe.execute()
+        logger.debug("Stored conversation history for user %s", user_id)
         return True
     except Exception as e:
-        print(f"Error storing conversation history: {e}")
+        logger.error("Error storing conversation history: %s", e)
+        return False
+
+async def store_conversation_history_async(user_id: str, task: str, result: str) -> bool:
+    """Store conversation/task history in Redis without blocking the event loop"""
+    try:
+        redis_key = f"conversation_history:{user_id}"
+        history_entry = _history_entry(task, result)
+        # Push and trim in a single MULTI round trip
+        pipe = async_redis_client.pipeline(transaction=True)
+        pipe.rpush(redis_key, history_entry)
+        pipe.ltrim(redis_key, -CONVERSATION_HISTORY_MAX_LENGTH, -1)
+        count_redis_round_trip("pipeline")
+        await pipe.execute()
+        logger.debug("Stored conversation history for user %s", user_id)
+        return True
+    except Exception as e:
+        logger.error("Error storing conversation history: %s", e)
         return False
 
 def get_conversation_history(user_id: str, limit: int = 10) -> List[Dict]:
@@ -75,64 +304,590 @@ def get_conversation_history(user_id: str, limit: int = 10) -> List[Dict]:
     try:
         redis_key = f"conversation_history:{user_id}"
         # Get last N conversations
+        count_redis_round_trip("lrange")
         history = redis_client.lrange(redis_key, -limit, -1)
         return [json.loads(entry) for entry in history]
     except Exception as e:
-        print(f"Error retrieving conversation history: {e}")
+        logger.error("Error retrieving conversation history: %s", e)
         return []
 
+async def get_conversation_history_async(user_id: str, limit: int = 10) -> List[Dict]:
+    """Retrieve recent conversation history for a user without blocking the event loop"""
+    try:
+        redis_key = f"conversation_history:{user_id}"
+        count_redis_round_trip("lrange")
+        history = await async_redis_client.lrange(redis_key, -limit, -1)
+        return [json.loads(entry) for entry in history]
+    except Exception as e:
+        logger.error("Error retrieving conversation history: %s", e)
+        return []
+
+def get_conversation_histories(user_ids: List[str], limit: int = 10) -> Dict[str, List[Dict]]:
+    """Retrieve recent conversation history for many users in one pipelined round trip"""
+    if not user_ids:
+        return {}
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.lrange(f"conversation_history:{user_id}", -limit, -1)
+        count_redis_round_trip("pipeline")
+        results = pipe.execute()
+        return {
+            user_id: [json.loads(entry) for entry in history]
+            for user_id, history in zip(user_ids, results)
+        }
+    except Exception as e:
+        logger.error("Error retrieving conversation histories: %s", e)
+        return {}
+
+async def get_conversation_histories_async(user_ids: List[str], limit: int = 10) -> Dict[str, List[Dict]]:
+    """Retrieve recent conversation history for many users in one pipelined round trip, without blocking the event loop"""
+    if not user_ids:
+        return {}
+    try:
+        pipe = async_redis_client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.lrange(f"conversation_history:{user_id}", -limit, -1)
+        count_redis_round_trip("pipeline")
+        results = await pipe.execute()
+        return {
+            user_id: [json.loads(entry) for entry in history]
+            for user_id, history in zip(user_ids, results)
+        }
+    except Exception as e:
+        logger.error("Error retrieving conversation histories: %s", e)
+        return {}
+
+def get_user_context(user_id: str, history_limit: int = 10) -> Tuple[Dict[str, str], List[Dict]]:
+    """Retrieve a user's long-term memories and recent history in one pipelined round trip"""
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hgetall(f"longterm_memory:{user_id}")
+        pipe.lrange(f"conversation_history:{user_id}", -history_limit, -1)
+        count_redis_round_trip("pipeline")
+        memories, history = pipe.execute()
+        return memories, [json.loads(entry) for entry in history]
+    except Exception as e:
+        logger.error("Error retrieving user context: %s", e)
+        return {}, []
+
+async def get_user_context_async(user_id: str, history_limit: int = 10) -> Tuple[Dict[str, str], List[Dict]]:
+    """Retrieve a user's long-term memories and recent history in one pipelined round trip, without blocking the event loop"""
+    try:
+        pipe = async_redis_client.pipeline(transaction=False)
+        pipe.hgetall(f"longterm_memory:{user_id}")
+        pipe.lrange(f"conversation_history:{user_id}", -history_limit, -1)
+        count_redis_round_trip("pipeline")
+        memories, history = await pipe.execute()
+        return memories, [json.loads(entry) for entry in history]
+    except Exception as e:
+        logger.error("Error retrieving user context: %s", e)
+        return {}, []
+
+def store_user_context(user_id: str, task: str, result: str, memories: Dict[str, str]) -> bool:
+    """Record a task in the user's history and store what was learned in one MULTI round trip"""
+    try:
+        history_key = f"conversation_history:{user_id}"
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.rpush(history_key, _history_entry(task, result))
+        pipe.ltrim(history_key, -CONVERSATION_HISTORY_MAX_LENGTH, -1)
+        if memories:
+            pipe.hset(f"longterm_memory:{user_id}", mapping=memories)
+        count_redis_round_trip("pipeline")
+        pipe.execute()
+        return True
+    except Exception as e:
+        logger.error("Error storing user context: %s", e)
+        return False
+
+async def store_user_context_async(user_id: str, task: str, result: str, memories: Dict[str, str]) -> bool:
+    """Record a task in the user's history and store what was learned in one MULTI round trip, without blocking the event loop"""
+    try:
+        history_key = f"conversation_history:{user_id}"
+        pipe = async_redis_client.pipeline(transaction=True)
+        pipe.rpush(history_key, _history_entry(task, result))
+        pipe.ltrim(history_key, -CONVERSATION_HISTORY_MAX_LENGTH, -1)
+        if memories:
+            pipe.hset(f"longterm_memory:{user_id}", mapping=memories)
+        count_redis_round_trip("pipeline")
+        await pipe.execute()
+        return True
+    except Exception as e:
+        logger.error("Error storing user context: %s", e)
+        return False
+
 # ===== LangCache Semantic Caching Functions =====
 
-def get_cached_response(query: str) -> Optional[str]:
-    """Check if a similar query has been cached"""
+def _parse_search_response(query: str, res: Any) -> Optional[str]:
+    """Extract the cached response string from a LangCache search result"""
+    logger.debug("Cached response: %s", res)
+    
+    # Check if res has a data attribute and if it's empty
+    if hasattr(res, 'data') and isinstance(res.data, list):
+        if len(res.data) == 0:
+            logger.debug("No cached response found for query: %s...", query[:50])
+            logger.debug("✗ Cache MISS for query: %s...", query[:50])
+            return None
+        # If data array has items, get the first one
+        res = res.data[0]
+    
+    # Handle case where res might be a list directly
+    if isinstance(res, list):
+        if len(res) == 0:
+            logger.debug("No cached response found for query: %s...", query[:50])
+            logger.debug("✗ Cache MISS for query: %s...", query[:50])
+            return None
+        res = res[0]
+    
+    if res:
+        logger.debug("✓ Cache HIT for query: %s...", query[:50])
+        # Return only the response field from the cache entry
+        return res.response if hasattr(res, 'response') else str(res)
+    else:
+        logger.debug("No cached response found for query: %s...", query[:50])
+        logger.debug("✗ Cache MISS for query: %s...", query[:50])
+    return None
+
+def search_langcache(query: str) -> Optional[str]:
+    """Look up a query in LangCache only, bypassing the local tier"""
     try:
-        res = langcache_client.search(
+        res = get_langcache_client().search(
             prompt=query,
             similarity_threshold=1
         )
-
-        print(f"Cached response: {res}")
-        
-        # Check if res has a data attribute and if it's empty
-        if hasattr(res, 'data') and isinstance(res.data, list):
-            if len(res.data) == 0:
-                print(f"No cached response found for query: {query[:50]}...")
-                print(f"✗ Cache MISS for query: {query[:50]}...")
-                return None
-            # If data array has items, get the first one
-            res = res.data[0]
-        
-        # Handle case where res might be a list directly
-        if isinstance(res, list):
-            if len(res) == 0:
-                print(f"No cached response found for query: {query[:50]}...")
-                print(f"✗ Cache MISS for query: {query[:50]}...")
-                return None
-            res = res[0]
-        
-        if res:
-            print(f"✓ Cache HIT for query: {query[:50]}...")
-            # Return only the response field from the cache entry
-            return res.response if hasattr(res, 'response') else str(res)
-        else:
-            print(f"No cached response found for query: {query[:50]}...")
-            print(f"✗ Cache MISS for query: {query[:50]}...")
+        return _parse_search_response(query, res)
+    except Exception as e:
+        logger.error("Error checking cache: %s", e)
         return None
+
+async def search_langcache_async(query: str) -> Optional[str]:
+    """Look up a query in LangCache only, without blocking the event loop"""
+    try:
+        res = await get_langcache_client().search_async(
+            prompt=query,
+            similarity_threshold=1
+        )
+        return _parse_search_response(query, res)
     except Exception as e:
-        print(f"Error checking cache: {e}")
+        logger.error("Error checking cache: %s", e)
         return None
 
-def cache_response(query: str, response: str) -> bool:
-    """Cache a query-response pair for future semantic matching"""
+def _ttl_millis(ttl_seconds: Optional[float]) -> Optional[int]:
+    return int(ttl_seconds * 1000) if ttl_seconds else None
+
+def set_langcache(query: str, response: str, ttl_seconds: Optional[float] = None) -> bool:
+    """Store a query-response pair in LangCache only"""
     try:
-        res = langcache_client.set(
+        res = get_langcache_client().set(
             prompt=query,
             response=response,
+            ttl_millis=_ttl_millis(ttl_seconds),
         )
 
-        print(f"Cached set for query: {query}")
+        logger.debug("Cached set for query: %s", query)
         return res
     except Exception as e:
-        print(f"Error caching response: {e}")
+        logger.error("Error caching response: %s", e)
         return False
 
+async def set_langcache_async(query: str, response: str, ttl_seconds: Optional[float] = None) -> bool:
+    """Store a query-response pair in LangCache only, without blocking the event loop"""
+    try:
+        res = await get_langcache_client().set_async(
+            prompt=query,
+            response=response,
+            ttl_millis=_ttl_millis(ttl_seconds),
+        )
+
+        logger.debug("Cached set for query: %s", query)
+        return res
+    except Exception as e:
+        logger.error("Error caching response: %s", e)
+        return False
+
+# ===== Semantic Cache Backends (tier 2) =====
+
+class CacheBackend(ABC):
+    """Semantic cache tier consulted after the local LRU"""
+
+    name = "base"
+
+    @abstractmethod
+    def search(self, query: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def set(self, query: str, response: str, ttl_seconds: Optional[float] = None) -> bool:
+        ...
+
+    async def search_async(self, query: str) -> Optional[str]:
+        return self.search(query)
+
+    async def search_many_async(self, queries: List[str]) -> List[Optional[str]]:
+        """Look up many queries at once; backends without a batch API run the lookups concurrently"""
+        return list(await asyncio.gather(*(self.search_async(query) for query in queries)))
+
+    async def set_async(self, query: str, response: str, ttl_seconds: Optional[float] = None) -> bool:
+        return self.set(query, response, ttl_seconds)
+
+    def warm_up(self) -> None:
+        """Load clients or models ahead of the first lookup"""
+
+    def close(self) -> None:
+        """Flush anything buffered before the process exits"""
+
+class LangCacheBackend(CacheBackend):
+    """Remote Redis LangCache service"""
+
+    name = "langcache"
+
+    def search(self, query: str) -> Optional[str]:
+        return search_langcache(query)
+
+    def set(self, query: str, response: str, ttl_seconds: Optional[float] = None) -> bool:
+        return set_langcache(query, response, ttl_seconds)
+
+    async def search_async(self, query: str) -> Optional[str]:
+        return await search_langcache_async(query)
+
+    async def set_async(self, query: str, response: str, ttl_seconds: Optional[float] = None) -> bool:
+        return await set_langcache_async(query, response, ttl_seconds)
+
+    def warm_up(self) -> None:
+        get_langcache_client()
+
+class HashingEmbedder:
+    """Dependency-free embedding from hashed word and character trigram features"""
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> "np.ndarray":
+        import numpy as np
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            normalized = normalize_prompt(text)
+            padded = f" {normalized} "
+            features = normalized.split() + [padded[i:i + 3] for i in range(len(padded) - 2)]
+            for feature in features:
+                vectors[row, zlib.crc32(feature.encode()) % self.dim] += 1.0
+        return vectors
+
+class FastEmbedEmbedder:
+    """Small ONNX sentence embedding model run on CPU via fastembed"""
+
+    def __init__(self, model_name: str):
+        if importlib.util.find_spec("fastembed") is None:
+            raise ImportError(
+                f"fastembed is not installed, so {model_name} cannot be loaded: "
+                "install the semantic extra or set SEMANTIC_CACHE_MODEL=hashing"
+            )
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        # Loading the ONNX model takes seconds, so it happens on the first embedding rather than at import
+        with self._lock:
+            if self._model is None:
+                from fastembed import TextEmbedding
+                self._model = TextEmbedding(model_name=self.model_name)
+        return self._model
+
+    def embed(self, texts: List[str]) -> "np.ndarray":
+        import numpy as np
+        return np.asarray(list(self._get_model().embed([normalize_prompt(t) for t in texts])), dtype=np.float32)
+
+def _load_embedder(model_name: str):
+    # No fallback to hashing: it needs a much stricter threshold, so it has to be chosen explicitly
+    if model_name == "hashing":
+        return HashingEmbedder()
+    return FastEmbedEmbedder(model_name)
+
+class LocalSemanticCacheBackend(CacheBackend):
+    """In-process semantic cache over a NumPy matrix of normalized prompt embeddings"""
+
+    name = "local"
+
+    def __init__(
+        self,
+        embedder,
+        threshold: float = 0.9,
+        max_entries: int = 10000,
+        path: Optional[str] = None,
+        save_interval_seconds: float = 60.0,
+    ):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.path = path
+        self.save_interval_seconds = save_interval_seconds
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._vectors: Optional["np.ndarray"] = None
+        self._prompts: List[str] = []
+        self._responses: List[str] = []
+        self._next_slot = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    def _embed(self, text: str) -> "np.ndarray":
+        import numpy as np
+        vector = self.embedder.embed([text])[0]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def warm_up(self) -> None:
+        self._embed("warm up")
+
+    def _best_match(self, vector: "np.ndarray") -> Tuple[int, float]:
+        import numpy as np
+        if not self._responses:
+            return -1, 0.0
+        scores = self._vectors[:len(self._responses)] @ vector
+        index = int(np.argmax(scores))
+        return index, float(scores[index])
+
+    def search(self, query: str) -> Optional[str]:
+        vector = self._embed(query)
+        with self._lock:
+            index, score = self._best_match(vector)
+            if index >= 0 and score >= self.threshold:
+                logger.debug("✓ Cache HIT for query: %s... (similarity %.3f)", query[:50], score)
+                return self._responses[index]
+        logger.debug("✗ Cache MISS for query: %s...", query[:50])
+        return None
+
+    def search_many(self, queries: List[str]) -> List[Optional[str]]:
+        """Embed every query in one batch and score them all with a single matrix product"""
+        import numpy as np
+        vectors = self.embedder.embed(queries).astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1)
+        norms[norms == 0] = 1.0
+        vectors /= norms[:, None]
+        with self._lock:
+            if not self._responses:
+                return [None] * len(queries)
+            scores = vectors @ self._vectors[:len(self._responses)].T
+            best = np.argmax(scores, axis=1)
+            return [
+                self._responses[index] if scores[row, index] >= self.threshold else None
+                for row, index in enumerate(best)
+            ]
+
+    async def search_async(self, query: str) -> Optional[str]:
+        # Embedding the query is CPU bound, keep it off the event loop
+        return await asyncio.to_thread(self.search, query)
+
+    async def search_many_async(self, queries: List[str]) -> List[Optional[str]]:
+        return await asyncio.to_thread(self.search_many, queries)
+
+    def set(self, query: str, response: str, ttl_seconds: Optional[float] = None) -> bool:
+        # Same-prompt entries are overwritten in place, so stale answers do not linger
+        import numpy as np
+        vector = self._embed(query)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            index, score = self._best_match(vector)
+            if index < 0 or score < 0.9999:
+                # Append until full, then overwrite the oldest entry
+                index = self._next_slot
+                self._next_slot = (self._next_slot + 1) % self.max_entries
+                if index == len(self._responses):
+                    self._prompts.append(query)
+                    self._responses.append(response)
+            self._vectors[index] = vector
+            self._prompts[index] = query
+            self._responses[index] = response
+            self._dirty = True
+        # The snapshot holds the whole index, so it is rewritten at most once per interval and on close
+        if self.path and time.monotonic() - self._saved_at >= self.save_interval_seconds:
+            self._save()
+        logger.debug("Cached set for query: %s", query)
+        return True
+
+    async def set_async(self, query: str, response: str, ttl_seconds: Optional[float] = None) -> bool:
+        # Embedding and persisting to disk are CPU/disk bound, keep them off the event loop
+        return await asyncio.to_thread(self.set, query, response, ttl_seconds)
+
+    def close(self) -> None:
+        if self.path and self._dirty:
+            self._save()
+
+    def _save(self) -> None:
+        import numpy as np
+        try:
+            with self._lock:
+                self._dirty = False
+                self._saved_at = time.monotonic()
+                count = len(self._responses)
+                vectors = self._vectors[:count].copy()
+                entries = json.dumps({
+                    "prompts": self._prompts,
+                    "responses": self._responses,
+                    "next_slot": self._next_slot,
+                })
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(f, vectors=vectors, entries=np.array(entries))
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self._dirty = True
+            logger.error("Error persisting semantic cache: %s", e)
+
+    def _load(self) -> None:
+        import numpy as np
+        try:
+            with np.load(self.path) as data:
+                vectors = data["vectors"]
+                entries = json.loads(str(data["entries"]))
+            count = min(len(entries["responses"]), self.max_entries)
+            self._vectors = np.zeros((self.max_entries, vectors.shape[1]), dtype=np.float32)
+            self._vectors[:count] = vectors[:count]
+            self._prompts = entries["prompts"][:count]
+            self._responses = entries["responses"][:count]
+            self._next_slot = entries["next_slot"] % self.max_entries
+            logger.info("Loaded %s semantic cache entries from %s", count, self.path)
+        except Exception as e:
+            logger.error("Error loading semantic cache: %s", e)
+
+def _create_cache_backend() -> CacheBackend:
+    if os.getenv("CACHE_BACKEND", "langcache").lower() == "local":
+        model_name = os.getenv("SEMANTIC_CACHE_MODEL", "BAAI/bge-small-en-v1.5")
+        # Hashed trigrams score prompts that differ in one number or word above 0.9
+        default_threshold = "0.99" if model_name == "hashing" else "0.9"
+        return LocalSemanticCacheBackend(
+            _load_embedder(model_name),
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", default_threshold)),
+            max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000")),
+            path=os.getenv("SEMANTIC_CACHE_PATH") or None,
+            save_interval_seconds=float(os.getenv("SEMANTIC_CACHE_SAVE_INTERVAL_SECONDS", "60")),
+        )
+    return LangCacheBackend()
+
+# Built on first use or by the lifespan warm-up: the local backend reads its snapshot from disk
+_cache_backend: Optional[CacheBackend] = None
+_cache_backend_lock = threading.Lock()
+
+def get_cache_backend() -> CacheBackend:
+    global _cache_backend
+    with _cache_backend_lock:
+        if _cache_backend is None:
+            _cache_backend = _create_cache_backend()
+    return _cache_backend
+
+async def warm_up_clients_async() -> None:
+    """Open a Redis connection and load the cache backend client before the first request"""
+    try:
+        count_redis_round_trip("ping")
+        await async_redis_client.ping()
+    except Exception as e:
+        logger.error("Error connecting to Redis: %s", e)
+    # A backend that cannot be built (e.g. its embedding model is not installed) fails startup
+    backend = await asyncio.to_thread(get_cache_backend)
+    try:
+        await asyncio.to_thread(backend.warm_up)
+    except Exception as e:
+        logger.error("Error warming up the %s cache backend: %s", backend.name, e)
+
+async def close_clients_async() -> None:
+    """Flush the cache backend on shutdown"""
+    if _cache_backend is None:
+        return
+    try:
+        await asyncio.to_thread(_cache_backend.close)
+    except Exception as e:
+        logger.error("Error closing the %s cache backend: %s", _cache_backend.name, e)
+
+def get_cached_response(query: str) -> Optional[str]:
+    """Check if a similar query has been cached (local LRU first, then the semantic cache backend)"""
+    start = time.perf_counter()
+    local = local_response_cache.get(query)
+    observe_cache_lookup("local", "hit" if local is not None else "miss", time.perf_counter() - start)
+    if local is not None:
+        logger.debug("✓ Local cache HIT for query: %s...", query[:50])
+        return local
+
+    cache_backend = get_cache_backend()
+    start = time.perf_counter()
+    try:
+        res = cache_backend.search(query)
+    except Exception as e:
+        observe_cache_lookup(cache_backend.name, "error", time.perf_counter() - start)
+        logger.error("Error checking cache: %s", e)
+        return None
+    observe_cache_lookup(cache_backend.name, "hit" if res else "miss", time.perf_counter() - start)
+    if res:
+        local_response_cache.set(query, res)
+    return res
+
+async def get_cached_response_async(query: str) -> Optional[str]:
+    """Check if a similar query has been cached, without blocking the event loop"""
+    start = time.perf_counter()
+    local = local_response_cache.get(query)
+    observe_cache_lookup("local", "hit" if local is not None else "miss", time.perf_counter() - start)
+    if local is not None:
+        logger.debug("✓ Local cache HIT for query: %s...", query[:50])
+        return local
+
+    cache_backend = get_cache_backend()
+    start = time.perf_counter()
+    try:
+        res = await cache_backend.search_async(query)
+    except Exception as e:
+        observe_cache_lookup(cache_backend.name, "error", time.perf_counter() - start)
+        logger.error("Error checking cache: %s", e)
+        return None
+    observe_cache_lookup(cache_backend.name, "hit" if res else "miss", time.perf_counter() - start)
+    if res:
+        local_response_cache.set(query, res)
+    return res
+
+async def get_cached_responses_async(queries: List[str]) -> List[Optional[str]]:
+    """Look up many queries in one pass: local LRU for each, then one bulk backend lookup for the rest"""
+    results: List[Optional[str]] = []
+    for query in queries:
+        start = time.perf_counter()
+        local = local_response_cache.get(query)
+        observe_cache_lookup("local", "hit" if local is not None else "miss", time.perf_counter() - start)
+        results.append(local)
+
+    missing = [index for index, result in enumerate(results) if result is None]
+    if not missing:
+        return results
+    cache_backend = get_cache_backend()
+    start = time.perf_counter()
+    try:
+        found = await cache_backend.search_many_async([queries[index] for index in missing])
+    except Exception as e:
+        for _ in missing:
+            observe_cache_lookup(cache_backend.name, "error", time.perf_counter() - start)
+        logger.error("Error checking cache: %s", e)
+        return results
+    elapsed = time.perf_counter() - start
+    for index, res in zip(missing, found):
+        observe_cache_lookup(cache_backend.name, "hit" if res else "miss", elapsed)
+        if res:
+            local_response_cache.set(queries[index], res)
+            results[index] = res
+    return results
+
+def cache_response(query: str, response: str, ttl_seconds: Optional[float] = None) -> bool:
+    """Cache a query-response pair for future semantic matching; the backend drops it after ttl_seconds"""
+    local_response_cache.set(query, response)
+    try:
+        return get_cache_backend().set(query, response, ttl_seconds)
+    except Exception as e:
+        logger.error("Error caching response: %s", e)
+        return False
+
+async def cache_response_async(query: str, response: str, ttl_seconds: Optional[float] = None) -> bool:
+    """Cache a query-response pair for future semantic matching, without blocking the event loop"""
+    local_response_cache.set(query, response)
+    try:
+        return await get_cache_backend().set_async(query, response, ttl_seconds)
+    except Exception as e:
+        logger.error("Error caching response: %s", e)
+        return False